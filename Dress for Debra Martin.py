@@ -2,6 +2,7 @@ from custom_knit_garments import Dress
 from measurements_Debra_Martin import person, body_data
 
 dress = Dress(body_data, person, gauge=(32, 38))
+dress.make_all()
 # breakpoint()
 if __name__ == "__main__":
     print(f"This design requires {dress.total_yarn_meters} "
@@ -2,6 +2,7 @@ from custom_knit_garments import Pencil_Skirt
 from measurements_Debra_Martin import person, body_data
 
 ps = Pencil_Skirt(body_data, person, gauge=(32, 38))
+ps.make_all()
 # breakpoint()
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ from custom_knit_garments import Tshirt
 from measurements_Debra_Martin import person, body_data
 
 tshirt = Tshirt(body_data, person, gauge=(32, 38))
+tshirt.make_all()
 # breakpoint()
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+"""
+Build garments for many clients at once on a pool of worker processes.
+
+Each job is a GarmentJob(person, body_data, garment_class, gauge).  run_batch hands the jobs to the
+pool a few at a time, so a long list of jobs (or a generator reading them from disk) never piles up
+in memory, and yields a JobResult(job, result, error) for every job as it finishes.  A job that fails
+only fills in its own error, the rest of the batch carries on.
+
+Example, from a per-client script:
+
+    from batch_garments import GarmentJob, run_batch
+    from custom_knit_garments import Tshirt, Dress
+    from measurements_Debra_Martin import person, body_data
+
+    jobs = [GarmentJob(person, body_data, Tshirt, (32, 38)), GarmentJob(person, body_data, Dress, (32, 38))]
+    for job_result in run_batch(jobs):
+        print(job_result.job.person, job_result.result or job_result.error)
+"""
+import argparse
+import concurrent.futures
+import importlib
+import os
+import traceback
+from collections import namedtuple
+
+import custom_knit_garments
+import measurement_files
+
+GarmentJob = namedtuple("GarmentJob", ["person", "body_data", "garment_class", "gauge"])
+JobResult = namedtuple("JobResult", ["job", "result", "error"])  # error is None or the formatted traceback
+
+
+def build_garment(job, make_outputs=True, cache_directory=None, profile_directory=None):
+    """
+    Runs one job.  This is what the worker processes call, it can also be called directly.
+    :param job: GarmentJob, garment_class may be a Garment subclass or its name in custom_knit_garments
+    :param make_outputs: False to only work out the yarn estimate, True to also make all the plots,
+        instructions and the pdf
+    :param cache_directory: directory of a custom_knit_garments.ArtifactCache to reuse outputs from
+    :param profile_directory: directory to write a profile of the stages of the garment to, as json and as a
+        chrome trace, see custom_knit_garments.StageProfiler
+    :return: dict with the garment title, yarn estimate and pdf file name
+    """
+    if cache_directory is not None:
+        custom_knit_garments.Garment.artifact_cache = custom_knit_garments.ArtifactCache(cache_directory)
+    garment_class = job.garment_class
+    if isinstance(garment_class, str):
+        garment_class = getattr(custom_knit_garments, garment_class)
+    garment = garment_class(job.body_data, job.person, gauge=tuple(job.gauge))
+    if profile_directory is not None:
+        garment.profiler = custom_knit_garments.StageProfiler()
+    result = {"title": garment.title, "total_yarn_meters": garment.total_yarn_meters, "pdf": None}
+    if make_outputs:
+        os.makedirs("./results", exist_ok=True)
+        os.makedirs("./patterns", exist_ok=True)
+        garment.make_all()
+        result["pdf"] = garment.pdf_file_name()
+    if profile_directory is not None:
+        os.makedirs(profile_directory, exist_ok=True)
+        garment.profiler.write_json(os.path.join(profile_directory, f"{garment.title} profile.json"))
+        garment.profiler.write_chrome_trace(os.path.join(profile_directory, f"{garment.title} trace.json"))
+    return result
+
+
+def run_job(job, make_outputs=True, cache_directory=None, profile_directory=None):
+    # the exception is formatted in the worker because not every exception can be pickled back
+    try:
+        return JobResult(job, build_garment(job, make_outputs, cache_directory, profile_directory), None)
+    except Exception:
+        return JobResult(job, None, traceback.format_exc())
+
+
+def run_batch(jobs, max_workers=None, max_pending=None, make_outputs=True, cache_directory=None,
+              profile_directory=None):
+    """
+    Runs jobs on a process pool and yields a JobResult for each one in the order they finish.
+    :param jobs: iterable of GarmentJob, read lazily
+    :param max_workers: number of worker processes, defaults to the number of cpus
+    :param max_pending: most jobs handed to the pool at once, defaults to twice the number of workers.
+        No more jobs are read from jobs until one finishes.
+    :param make_outputs: passed to build_garment
+    :param cache_directory: passed to build_garment
+    :param profile_directory: passed to build_garment
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * max_workers
+    jobs = iter(jobs)
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    pending = {}  # future: job
+    try:
+        while True:
+            for job in jobs:
+                pending[pool.submit(run_job, job, make_outputs, cache_directory, profile_directory)] = job
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                return
+            finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            pool_broken = False
+            for future in finished:
+                job = pending.pop(future)
+                try:
+                    yield future.result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    # a worker died outright, for example killed for using too much memory
+                    pool_broken = True
+                    yield JobResult(job, None, traceback.format_exc())
+            if pool_broken:
+                # every job still in the dead pool fails with it, carry on with a new pool
+                for future, job in pending.items():
+                    yield JobResult(job, None, "Worker process pool stopped before this job finished.")
+                pending.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Make garment patterns for many clients on all cpus.")
+    parser.add_argument("measurements", nargs="+",
+                        help="measurement modules with person and body_data, e.g. measurements_Debra_Martin, "
+                             "or .csv, .tsv or .jsonl files of many clients, see measurement_files")
+    parser.add_argument("--garment", nargs="+", default=["Tshirt"], help="Tshirt, Dress and/or Pencil_Skirt")
+    parser.add_argument("--gauge", nargs=2, type=int, default=[10, 10], metavar=("STITCHES", "ROWS"),
+                        help="stitches and rows per 10 cm")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--yarn-only", action="store_true", help="only work out the yarn estimates")
+    parser.add_argument("--cache", default=None, metavar="DIRECTORY",
+                        help="reuse plots, instructions and pdfs already made from the same inputs")
+    parser.add_argument("--profile", default=None, metavar="DIRECTORY",
+                        help="write how long each stage of each garment took here")
+    args = parser.parse_args()
+
+    failures = 0
+
+    def invalid_client(file_name, line, message):
+        nonlocal failures
+        failures += 1
+        print(f"SKIPPED {file_name} line {line}: {message}")
+
+    def all_jobs():
+        for name in args.measurements:
+            if measurement_files.is_measurements_file(name):
+                clients = measurement_files.read_measurements(
+                    name, args.garment, invalid=lambda line, message: invalid_client(name, line, message))
+            else:
+                measurements = importlib.import_module(name.removesuffix(".py"))
+                clients = [measurement_files.MeasurementRecord(measurements.person, measurements.body_data, None)]
+            for client in clients:
+                for garment in args.garment:
+                    yield GarmentJob(client.person, client.body_data, garment, tuple(args.gauge))
+
+    for job_result in run_batch(all_jobs(), max_workers=args.workers, make_outputs=not args.yarn_only,
+                                cache_directory=args.cache, profile_directory=args.profile):
+        if job_result.error:
+            failures += 1
+            print(f"FAILED {job_result.job.garment_class} for {job_result.job.person}:\n{job_result.error}")
+        else:
+            print(f"{job_result.result['title']}: {job_result.result['total_yarn_meters']} meters of yarn")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,55 +1,147 @@
-import matplotlib
-import matplotlib.pyplot as plt
-import itertools
+import argparse
+import concurrent.futures
+import contextlib
+import csv
+import functools
+import hashlib
+import io
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
 import numpy as np
-from collections import OrderedDict
+from collections import Counter, OrderedDict, namedtuple
+from collections.abc import Mapping
+import bisect
 from operator import getitem
 import textwrap as tr
-import fpdf
 import math
 
+# matplotlib and fpdf are only imported by the stages that draw plots or make the pdf, so the shapes, needle
+# charts and yarn estimates can be worked out without loading them
+
+
+def __getattr__(name):
+    if name in ("PDF", "PDFResources"):
+        import garment_pdf
+        return getattr(garment_pdf, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class Point:
+    __slots__ = ("x_val", "y_val")
+
     def __init__(self, x_val, y_val):
         self.x_val = x_val
         self.y_val = y_val
-        self.coord = {"x": x_val, "y": y_val}
+
+    @property
+    def coord(self):
+        return {"x": self.x_val, "y": self.y_val}
 
 
 class Seg:
+    __slots__ = ("x1", "y1", "x2", "y2")
+
     def __init__(self, point1, point2):
-        self.coord1 = point1.coord
-        self.coord2 = point2.coord
-        self.seg = [point1.coord, point2.coord]
-        self.x_vals = np.array([point1.coord["x"], point2.coord["x"]])
-        self.y_vals = np.array([point1.coord["y"], point2.coord["y"]])
-        # self.length = d=√((x2 – x1)² + (y2 – y1)²)
-        self.length = ((self.x_vals[1] - self.x_vals[0]) ** 2 + (self.y_vals[1] - self.y_vals[0]) ** 2) ** .5
-        self.midpoint = Point((self.x_vals[1] + self.x_vals[0]) / 2, (self.y_vals[1] + self.y_vals[0]) / 2)
+        self.x1, self.y1 = point1.x_val, point1.y_val
+        self.x2, self.y2 = point2.x_val, point2.y_val
+
+    @property
+    def coord1(self):
+        return {"x": self.x1, "y": self.y1}
+
+    @property
+    def coord2(self):
+        return {"x": self.x2, "y": self.y2}
+
+    @property
+    def seg(self):
+        return [self.coord1, self.coord2]
+
+    @property
+    def x_vals(self):
+        return np.array([self.x1, self.x2])
+
+    @property
+    def y_vals(self):
+        return np.array([self.y1, self.y2])
+
+    @property
+    def length(self):
+        # d=√((x2 – x1)² + (y2 – y1)²)
+        return ((self.x2 - self.x1) ** 2 + (self.y2 - self.y1) ** 2) ** .5
+
+    @property
+    def midpoint(self):
+        return Point((self.x2 + self.x1) / 2, (self.y2 + self.y1) / 2)
 
     def contains_y(self, y_value):
-        return not (y_value < min(self.y_vals) or y_value > max(self.y_vals))
+        return not (y_value < min(self.y1, self.y2) or y_value > max(self.y1, self.y2))
 
     def x_intercept(self, y_value):
         if self.contains_y(y_value):
-            if self.y_vals[0] > self.y_vals[1]:
+            if self.y1 > self.y2:
                 # need to flip the order of points if y values are descending
-                return np.interp(y_value, (self.y_vals[1], self.y_vals[0]), (self.x_vals[1], self.x_vals[0]))
+                return np.interp(y_value, (self.y2, self.y1), (self.x2, self.x1))
             else:
-                return np.interp(y_value, self.y_vals, self.x_vals)
+                return np.interp(y_value, (self.y1, self.y2), (self.x1, self.x2))
         raise Exception("Module custom_knit_garments: No y intercept found.  "
                         "Must use Seg method contains_y before using Seg method x_intercept.")
 
     @property
     def all_x_vals(self):  # may not ever use this
         x_intercepts = []
-        count = min(self.y_vals)
-        while count <= max(self.y_vals):
+        count = min(self.y1, self.y2)
+        while count <= max(self.y1, self.y2):
             x_intercepts.append(self.x_intercept(count))
             count += 1
         return x_intercepts
 
 
+def row_intercepts(edges, row_heights_cm, stitch_width_cm):
+    """
+    Batched version of Seg.contains_y and Seg.x_intercept for every segment of a closed shape at once.
+    :param edges: edge table of the closed outline in cm, as Shape.edges
+    :param row_heights_cm: array of the y value in cm of every row
+    :param stitch_width_cm: stitch width in cm, a float or an array with one value per row
+    :return: tuple (intercepts, counts).  intercepts is a (rows x spans) int array holding the unique
+        needle intercepts of each row in ascending order, padded on the right with zeros.  counts holds
+        the number of real intercepts in each row.
+    """
+    rows = np.asarray(row_heights_cm, dtype=float)[:, np.newaxis]
+    stitch_width_cm = np.asarray(stitch_width_cm, dtype=float)
+    if stitch_width_cm.ndim:
+        stitch_width_cm = stitch_width_cm[:, np.newaxis]
+    # order the ends of every segment by ascending y, the same flip Seg.x_intercept does
+    flip = edges["y1"] > edges["y2"]
+    low_x = np.where(flip, edges["x2"], edges["x1"])
+    high_x = np.where(flip, edges["x1"], edges["x2"])
+    low_y, high_y = edges["ymin"], edges["ymax"]
+    contains = (rows >= low_y) & (rows <= high_y)
+    # same arithmetic as np.interp so the results are identical to Seg.x_intercept
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (high_x - low_x) / (high_y - low_y)
+        x_cm = np.where(rows == high_y, high_x,
+                        np.where(rows == low_y, low_x, slope * (rows - low_y) + low_x))
+        needles = np.where(contains, np.trunc(x_cm / stitch_width_cm), np.inf)
+    # np.unique for every row at once: sort, then drop repeats and the segments that miss the row
+    needles = np.sort(needles, axis=1)
+    keep = np.isfinite(needles)
+    keep[:, 1:] &= needles[:, 1:] != needles[:, :-1]
+    counts = keep.sum(axis=1)
+    order = np.argsort(~keep, axis=1, kind="stable")
+    needles = np.take_along_axis(np.where(keep, needles, 0), order, axis=1)
+    intercepts = needles[:, :max(counts.max(initial=0), 1)].astype(np.int64)
+    return intercepts, counts
+
+
 class Shape:
     """
     class Shape has no init because it is used as a super class solely to define methods for all
@@ -57,39 +149,122 @@ class Shape:
     EXAMPLES are - Body, PatternPiece.
     Since all shapes are created by subclasses of this super class, Shape itself
     needs no constructor.
-    The subclasses of Shape use points or something from which points can be derived
-    in their respective constructors, therefore, it is safe
-    to ignore unresolved point reference warnings for class Shape
+    The subclasses of Shape store their outline as self.coords, one contiguous (N, 2) float array
+    of x, y pairs in cm in drawing order, therefore, it is safe to ignore unresolved coords
+    reference warnings for class Shape.  Everything else is derived from coords once and cached,
+    so a shape must not be changed after it is made.
     """
 
-    @property
-    def y_vals(self):
-        y_vals = []
-        for point in self.points:
-            y_vals.append(point.coord["y"])
-        y_vals.append(self.points[0].coord["y"])
-        return y_vals
-
-    @property
-    def x_vals(self):
-        x_vals = []
-        for point in self.points:
-            x_vals.append(point.coord["x"])
-        x_vals.append(self.points[0].coord["x"])
-        return x_vals
-
-    @property
+    @functools.cached_property
+    def points(self):  # Point views of coords, kept for code that still works point by point
+        return [Point(x_val, y_val) for x_val, y_val in self.coords.tolist()]
+
+    @functools.cached_property
+    def y_vals(self):  # closed outline, first point repeated at the end
+        return np.append(self.coords[:, 1], self.coords[0, 1])
+
+    @functools.cached_property
+    def x_vals(self):  # closed outline, first point repeated at the end
+        return np.append(self.coords[:, 0], self.coords[0, 0])
+
+    @functools.cached_property
+    def area(self):  # area inside the outline in square cm
+        x_vals, y_vals = self.coords[:, 0], self.coords[:, 1]
+        return abs(float(x_vals @ np.roll(y_vals, -1) - y_vals @ np.roll(x_vals, -1))) / 2
+
+    @functools.cached_property
+    def edges(self):
+        """
+        edge table with one record per segment of the closed outline, in the same order as segments.
+        fields are x1, y1, x2, y2, dx, dy, ymin and ymax
+        """
+        x_vals, y_vals = self.x_vals, self.y_vals
+        edges = np.empty(len(self.coords), dtype=[(field, float) for field in
+                                                  ("x1", "y1", "x2", "y2", "dx", "dy", "ymin", "ymax")])
+        edges["x1"], edges["x2"] = x_vals[:-1], x_vals[1:]
+        edges["y1"], edges["y2"] = y_vals[:-1], y_vals[1:]
+        edges["dx"] = edges["x2"] - edges["x1"]
+        edges["dy"] = edges["y2"] - edges["y1"]
+        edges["ymin"] = np.minimum(edges["y1"], edges["y2"])
+        edges["ymax"] = np.maximum(edges["y1"], edges["y2"])
+        return edges
+
+    @functools.cached_property
     def segments(self):
-        segments = [Seg(pair[0], pair[1]) for pair in itertools.pairwise(self.points)]
-        # for pair in itertools.pairwise(self.points):
-        #     segments.append(Seg(pair[0], pair[1]))
-        segments.append(Seg(self.points[-1], self.points[0]))
+        segments = []
+        for x1, y1, x2, y2 in self.edges[["x1", "y1", "x2", "y2"]].tolist():
+            segment = Seg.__new__(Seg)
+            segment.x1, segment.y1, segment.x2, segment.y2 = x1, y1, x2, y2
+            segments.append(segment)
         return segments
 
 
+class Measurements(Mapping):
+    """
+    Read only table of body measurements, place name: {"meas": cm, "height": cm, "circumferential": bool}, in
+    order of height.  The measurements are kept in one structured numpy array sorted by height once, which is
+    never changed, so one person's Measurements can be shared by any number of garments and threads.
+    Looking up a place returns a read only mapping.  with_places makes a new Measurements with places added or
+    replaced, the Garment adjusters use it to add their derived points without touching the measurements they
+    were given.
+    """
+    dtype = np.dtype([("place", object), ("meas", float), ("height", float), ("circumferential", bool)])
+
+    def __init__(self, body_data):
+        """
+        :param body_data: dict of place name: {"meas", "height", "circumferential"}, as in the measurement data
+            files, or another Measurements, whose table is shared rather than copied
+        """
+        if isinstance(body_data, Measurements):
+            table = body_data.table
+        else:
+            table = np.array([(place, values["meas"], values["height"], values["circumferential"])
+                              for place, values in body_data.items()], dtype=self.dtype)
+            table = table[np.argsort(table["height"], kind="stable")]
+            table.flags.writeable = False
+        self.table = table
+        self.rows = {place: row for row, place in enumerate(table["place"])}
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, place):
+        _, meas, height, circumferential = self.table[self.rows[place]].tolist()
+        return types.MappingProxyType({"meas": meas, "height": height, "circumferential": circumferential})
+
+    def __repr__(self):
+        return f"Measurements({self.as_dict()!r})"
+
+    def as_dict(self):
+        # plain nested dicts in order of height, as in the measurement data files
+        return {place: dict(self[place]) for place in self}
+
+    def with_places(self, **places):
+        """
+        :param places: place name=dict of "meas", "height" and "circumferential" for each place to add or replace
+        :return: a new Measurements, this one is not changed
+        """
+        kept = self.table[[place not in places for place in self.table["place"]]]
+        added = np.array([(place, values["meas"], values["height"], values["circumferential"])
+                          for place, values in places.items()], dtype=self.dtype)
+        table = np.concatenate([kept, added])
+        table = table[np.argsort(table["height"], kind="stable")]
+        table.flags.writeable = False
+        return Measurements._from_table(table)
+
+    @classmethod
+    def _from_table(cls, table):
+        measurements = cls.__new__(cls)
+        measurements.table = table
+        measurements.rows = {place: row for row, place in enumerate(table["place"])}
+        return measurements
+
+
 class Body(Shape):
     def __init__(self, body_data, person):
-        self.points = []  # Necessary - the ordered list of point tuples which defines the closed shape
         self.person = person
         # sort measurements by height
         # see sort_nested_dict_by_key.py scratch file for example
@@ -97,34 +272,31 @@ class Body(Shape):
         sorted_body = OrderedDict(sorted(body_data.items(),
                                          key=lambda x: getitem(x[1], 'height')))
 
-        # create points and make an ordered list of points
+        # create points and make an ordered list of point coordinates
         def create_body_point(place, left=True, circumferential=True):
             if left and circumferential:
-                point = Point(-sorted_body[place]["meas"] / 4, sorted_body[place]["height"])
-                return point
+                return -sorted_body[place]["meas"] / 4, sorted_body[place]["height"]
             if not left and circumferential:
-                point = Point(sorted_body[place]["meas"] / 4, sorted_body[place]["height"])
-                return point
+                return sorted_body[place]["meas"] / 4, sorted_body[place]["height"]
             if left and not circumferential:
-                point = Point(-sorted_body[place]["meas"] / 2, sorted_body[place]["height"])
-                return point
+                return -sorted_body[place]["meas"] / 2, sorted_body[place]["height"]
             if not left and not circumferential:
-                point = Point(sorted_body[place]["meas"] / 2, sorted_body[place]["height"])
-                return point
+                return sorted_body[place]["meas"] / 2, sorted_body[place]["height"]
             raise Exception("module: points_and_segs create_body_point definition has a problem")
 
+        coords = []  # the ordered list of point tuples which defines the closed shape
         for place in sorted_body:
             if place != "frontNeck" and place != "backNeck":
-                this_point = create_body_point(place, circumferential=sorted_body[place]["circumferential"])
-                self.points.append(this_point)
-        self.points.append(create_body_point("backNeck"))
-        self.points.append(Point(0, y_val=sorted_body["backNeck"]["height"]))
-        self.points.append(Point(0, y_val=sorted_body["frontNeck"]["height"]))
-        self.points.append(Point(x_val=sorted_body["frontNeck"]["meas"] / 6, y_val=sorted_body["frontNeck"]["height"]))
+                coords.append(create_body_point(place, circumferential=sorted_body[place]["circumferential"]))
+        coords.append(create_body_point("backNeck"))
+        coords.append((0, sorted_body["backNeck"]["height"]))
+        coords.append((0, sorted_body["frontNeck"]["height"]))
+        coords.append((sorted_body["frontNeck"]["meas"] / 6, sorted_body["frontNeck"]["height"]))
         for place in sorted_body.__reversed__():
             if place != "frontNeck" and place != "backNeck":
-                this_point = create_body_point(place, left=False, circumferential=sorted_body[place]["circumferential"])
-                self.points.append(this_point)
+                coords.append(create_body_point(place, left=False,
+                                                circumferential=sorted_body[place]["circumferential"]))
+        self.coords = np.array(coords, dtype=float)
 
     def add_to_subplot(self, subplot):  # sets artists for body plots
         subplot.plot(self.x_vals,
@@ -136,134 +308,730 @@ class Body(Shape):
 
 class PatternPiece(Shape):
     def __init__(self, points):
-        self.points = points
-
-
-class PDF(fpdf.FPDF):
-    # page width = 215.9mm
-    # column 1 span = 58.6mm
-    # column 2 span = 123mm
-    # col 1 x pos = 10
-    # col 2 x pos = 78.6
-
-    def header(self):
-        self.set_font(family="Helvetica", style="", size=12)
-        width = self.get_string_width(self.title) + 6
-        # self.image("./images/stitches_logo.png", x=((210 - width) / 2) - 5, y=15, w=10, h=10, type='', link='')
-        self.set_x((216 - width) / 2)
-        self.set_draw_color(255, 204, 239)
-        self.set_fill_color(255, 230, 247)
-        self.set_text_color(0, 0, 0)
-        self.set_line_width(.25)
-        if self.page_no() > 1:
-            self.cell(
-                width,
-                10,
-                self.title,
-                border=0,
-                new_x="LMARGIN",
-                new_y="NEXT",
-                align="C",
-                fill=False,
-            )
-            self.cell(w=80, h=10, new_x="LMARGIN", new_y="NEXT")
-
-    def print_cover_page(self, image, cover_text):
-        self.set_font(family="Brazilia", style="", size=36)
-        width = self.get_string_width(self.title.upper()) + 6
-        self.set_xy((216 - width) / 2, 20)
-        self.set_text_color(102, 0, 70)
-        self.cell(
-            w=width,
-            h=10,
-            text=self.title.upper(),
-            border=0,
-            new_x="LMARGIN",
-            new_y="NEXT",
-            align="C",
-            fill=False
-        )
-        self.image(x=78, y=35, name=image, w=123)
-        self.set_font(family="Brazilia", style="", size=12)
-        self.set_y(45)
-        self.multi_cell(w=59, h=5, text=cover_text, border=0, new_x="LMARGIN", new_y="NEXT", align="L", fill=False)
-
-    def print_stitch_table_page(self, td):
-        self.add_page()
-        # self.image(x=5+(216/2), y=25, name=image, w=186/2)
-        # self.set_font(family="Brazilia", style="", size=14)
-        self.set_text_color(102, 0, 70)
-        self.set_y(25)
-        # self.multi_cell(
-        #     w=186/2,
-        #     h=6,
-        #     text=cover_text,
-        #     border=1,
-        #     new_x="LMARGIN",
-        #     new_y="NEXT",
-        #     align="L",
-        #     fill=False
-        #
-        # )
-        self.set_font(family="Times", style="", size=10)
-        self.set_fill_color(255, 255, 255)
-        self.set_text_color(0, 0, 0)
-        with self.table(borders_layout='MINIMAL',
-                        cell_fill_color=200,
-                        cell_fill_mode='ROWS',
-                        line_height=self.font_size * 1.5,
-                        text_align='CENTER',
-                        width=160) as table:
-            for data_row in td:
-                row = table.row()
-                for data in data_row:
-                    row.cell(data)
-
-    def print_stitch_map(self, image):
-        self.add_page()
-        self.image(x=10, y=25, name=image, w=196)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font(family="helvetica", style="I", size=8)
-        if self.page_no() != 1:
-            self.cell(w=0, h=10, text=f"Page {self.page_no()}/{{nb}}", align="C")
-
-    def chapter_title(self, num, label):
-        self.set_font(family="Brazilia", style="", size=24)
-        self.set_text_color(0, 0, 0)
-        self.set_fill_color(255, 230, 247)
-        # self.set_y(-130)
-        self.cell(
-            w=0,
-            h=10,
-            text=f"{label}: Knit {num}",
-            new_x="LMARGIN",
-            new_y="NEXT",
-            border="L",
-            fill=True,
-        )
-        self.cell(w=0, h=4)
-
-    def chapter_body(self, file_name):
-        # Reading text file:
-        with open(file_name, "rb") as fh:
-            txt = fh.read().decode("latin-1")
-        with self.text_columns(
-                ncols=2, gutter=5, text_align="J", line_height=1.5
-        ) as cols:
-            self.set_font(family="Brazilia", size=12)
-            self.set_text_color(0, 0, 0)
-            cols.write(txt)
-            cols.ln()
-            # Final mention in italics:
-            # self.set_font(style="I")
-            # cols.write(f"end {pattern_piece_name}")
-
-    def print_chapter(self, num, title, file_name):
-        self.add_page()
-        self.chapter_title(num, title)
-        self.chapter_body(file_name)
+        """
+        :param points: the ordered points of the closed shape, either Point objects or an (N, 2) array of x, y in cm
+        """
+        if len(points) and isinstance(points[0], Point):
+            points = [(point.x_val, point.y_val) for point in points]
+        self.coords = np.array(points, dtype=float).reshape(-1, 2)
+
+
+class NeedleBed:
+    """
+    The needles of a knitting machine bed, numbered out from the centre of the bed.
+    left_needles and right_needles are the number of needles each side of centre.  Brother style beds have
+    no needle 0 (needles run 100 ... 1, 1 ... 100), which is the default.  Set zero_needle to True for beds
+    whose centre needle is numbered 0.
+    """
+
+    def __init__(self, left_needles=100, right_needles=100, zero_needle=False):
+        self.left_needles = left_needles
+        self.right_needles = right_needles
+        self.zero_needle = zero_needle
+        self.needles = np.array([needle for needle in range(-left_needles, right_needles + 1)
+                                 if zero_needle or needle != 0])
+
+    def __repr__(self):
+        return f"NeedleBed({self.left_needles}, {self.right_needles}, zero_needle={self.zero_needle})"
+
+    @property
+    def width(self):
+        return len(self.needles)
+
+    def check_fits(self, intercepts, counts, piece_name=""):
+        # raise a ValueError rather than silently dropping stitches that are off the bed
+        real = np.arange(intercepts.shape[1]) < counts[:, np.newaxis]
+        leftmost = intercepts[real].min(initial=0)
+        rightmost = intercepts[real].max(initial=0)
+        if leftmost < -self.left_needles or rightmost > self.right_needles:
+            raise ValueError(f"Module custom_knit_garments: {piece_name} needs needles {leftmost} to {rightmost}, "
+                             f"which does not fit on {self!r} with needles {-self.left_needles} to "
+                             f"{self.right_needles}.  Use a wider needle bed or a coarser gauge.")
+
+    def needles_between(self, low, high):
+        # the number of needles on the bed from needle low to needle high, both included, for arrays of low and high
+        low = np.maximum(low, -self.left_needles)
+        high = np.minimum(high, self.right_needles)
+        needles = np.maximum(high - low + 1, 0)
+        if not self.zero_needle:
+            needles -= (low <= 0) & (high >= 0)
+        return needles
+
+    def stitches_per_row(self, intercepts, counts):
+        """
+        The number of needles in work in many rows at once, from the ends of the spans of each row.  The same
+        as counting the needles of states(intercepts, counts) that are not out of work, without making them.
+        :param intercepts: (rows x spans) int array of needle intercepts, as returned by row_intercepts
+        :param counts: number of real intercepts in each row, as returned by row_intercepts
+        :return: int array of the stitches in each row
+        """
+        right = intercepts[:, 1] if intercepts.shape[1] > 1 else np.zeros(len(counts), dtype=np.int64)
+        stitches = self.needles_between(intercepts[:, 0], right)
+        if intercepts.shape[1] > 3:  # the split section, to the right of the first span
+            stitches += np.where(counts > 3, self.needles_between(intercepts[:, 2], intercepts[:, 3]), 0)
+        return stitches
+
+    def states(self, intercepts, counts):
+        """
+        needle states for many rows at once
+        :param intercepts: (rows x spans) int array of needle intercepts, as returned by row_intercepts
+        :param counts: number of real intercepts in each row, as returned by row_intercepts
+        :return: (rows x needles) uint8 array of NeedleStates codes, one column per needle in self.needles
+        """
+        needles = self.needles
+        states = np.full((len(counts), len(needles)), NeedleStates.OUT_OF_WORK, dtype=np.uint8)
+        in_work = (intercepts[:, [0]] <= needles) & (needles <= intercepts[:, [1]])
+        states[in_work] = NeedleStates.IN_WORK
+        if intercepts.shape[1] > 3:
+            split = (counts[:, np.newaxis] > 3) & (intercepts[:, [2]] <= needles) & (needles <= intercepts[:, [3]])
+            states[split] = NeedleStates.SPLIT
+        return states
+
+
+class NeedleStates:
+    """
+    Needle states of every row of a pattern piece as one (rows x needles) uint8 array.
+    Column i is needle bed.needles[i].  The codes are
+        OUT_OF_WORK "A", IN_WORK "B", SELECTED "C" (not used yet) and SPLIT "E", which is not really a needle
+        position but keeps track of stitches on split sections
+    """
+    OUT_OF_WORK, IN_WORK, SELECTED, SPLIT = 0, 1, 2, 3
+    letters = np.array(["A", "B", "C", "E"])
+
+    def __init__(self, states, bed):
+        self.states = states
+        self.bed = bed
+
+    def __len__(self):
+        return len(self.states)
+
+    def in_work(self):
+        return self.states != self.OUT_OF_WORK
+
+    def stitches_per_row(self):
+        return np.count_nonzero(self.states, axis=1)
+
+    def total_stitches(self):
+        return int(np.count_nonzero(self.states))
+
+    def needles_ever_used(self):
+        return self.bed.needles[self.in_work().any(axis=0)]
+
+    def working_needles(self, row):
+        return self.bed.needles[self.states[row] != self.OUT_OF_WORK]
+
+    def row_letters(self, row):
+        # the needle state dict of the row dict, {needle: "A", "B" or "E"}
+        return dict(zip(self.bed.needles.tolist(), self.letters[self.states[row]].tolist()))
+
+    def packed(self):
+        # in work / out of work as one bit per needle, see np.unpackbits(..., axis=1, count=self.bed.width)
+        return np.packbits(self.in_work(), axis=1)
+
+
+ChartRun = namedtuple("ChartRun", ["start_row", "end_row", "spans"])  # rows start_row to end_row inclusive
+
+
+class NeedleChart(Mapping):
+    """
+    Run length encoded needle chart for one pattern piece.
+    Consecutive rows with identical intercepts are stored once as a ChartRun(start_row, end_row, spans),
+    where spans is the int array of needle intercepts for every row of the run.  row_status is a dict
+    holding the status of the few rows that are not plain "knit" rows.  bed is the NeedleBed the chart is
+    knitted on.
+    NeedleChart is a read only mapping of row number to the row dict the rest of Garment has always used,
+    {"row_status", "intercepts", "all", "needle_states"}, built on demand whenever a row is looked up.
+    Row dicts are not stored, so change a row status with chart.row_status[row] = status.
+    """
+
+    def __init__(self, runs, row_status, bed):
+        self.runs = runs
+        self.row_status = row_status
+        self.bed = bed
+        self.run_starts = [run.start_row for run in runs]
+
+    @classmethod
+    def from_intercepts(cls, intercepts, counts, row_status, bed):
+        """
+        :param intercepts: (rows x spans) int array of needle intercepts, as returned by row_intercepts
+        :param counts: number of real intercepts in each row, as returned by row_intercepts
+        :param row_status: dict of row number to status for rows that are not "knit" rows
+        :param bed: NeedleBed
+        """
+        changes = (counts[1:] != counts[:-1]) | np.any(intercepts[1:] != intercepts[:-1], axis=1)
+        starts = [0] + (np.flatnonzero(changes) + 1).tolist()
+        ends = [start - 1 for start in starts[1:]] + [len(counts) - 1]
+        runs = [ChartRun(start, end, intercepts[start, :counts[start]].copy()) for start, end in zip(starts, ends)]
+        return cls(runs, row_status, bed)
+
+    def __len__(self):
+        return self.runs[-1].end_row + 1 if self.runs else 0
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __getitem__(self, row):
+        if not (isinstance(row, (int, np.integer)) and 0 <= row < len(self)):
+            raise KeyError(row)
+        spans = self.run_for_row(row).spans
+        needle_states = self.run_states([spans])
+        return {"row_status": self.row_status.get(row, "knit"),
+                "intercepts": spans,
+                "all": needle_states.working_needles(0).tolist(),
+                "needle_states": needle_states.row_letters(0)}
+
+    def run_for_row(self, row):
+        return self.runs[bisect.bisect_right(self.run_starts, row) - 1]
+
+    def run_lengths(self):
+        return np.array([run.end_row - run.start_row + 1 for run in self.runs])
+
+    def run_intercepts(self, spans_list=None):
+        # (intercepts, counts) like row_intercepts, with one row per run, or per spans in spans_list
+        if spans_list is None:
+            spans_list = [run.spans for run in self.runs]
+        counts = np.array([len(spans) for spans in spans_list])
+        intercepts = np.zeros((len(spans_list), max(counts.max(initial=0), 2)), dtype=np.int64)
+        for index, spans in enumerate(spans_list):
+            intercepts[index, :len(spans)] = spans
+        return intercepts, counts
+
+    def run_states(self, spans_list=None):
+        # NeedleStates with one row per run, or per spans in spans_list
+        return NeedleStates(self.bed.states(*self.run_intercepts(spans_list)), self.bed)
+
+    def needle_states(self):
+        # NeedleStates for every row of the chart
+        return NeedleStates(np.repeat(self.run_states().states, self.run_lengths(), axis=0), self.bed)
+
+    def as_dict(self):
+        # json serializable copy of the chart, the runs as [start_row, end_row, [spans]]
+        return {"rows": len(self),
+                "row_status": {str(row): status for row, status in sorted(self.row_status.items())},
+                "runs": [[run.start_row, run.end_row, run.spans.tolist()] for run in self.runs]}
+
+    def shaping_rows(self):
+        # the only rows where the instructions can change: the first row of each run and every row with a status
+        return sorted(set(self.run_starts).union(self.row_status))
+
+
+# Binary needle chart files for knitting machine controllers, see write_chart_file.  A 128 byte header is followed
+# by one record of record_bytes for every row, so row n starts at header_bytes + n * record_bytes and any row can be
+# read without reading the rest, see read_chart_file.  Everything is little endian.
+chart_file_magic = b"KNITCHRT"
+chart_file_version = 1
+chart_file_header = np.dtype([("magic", "S8"), ("version", "<u2"), ("header_bytes", "<u2"), ("record_bytes", "<u2"),
+                              ("max_spans", "<u2"), ("rows", "<u4"), ("gauge", "<u2", (2,)),
+                              ("left_needles", "<u2"), ("right_needles", "<u2"), ("zero_needle", "u1"),
+                              ("style", "S32"), ("piece", "S32"), ("reserved", "V35")])
+# the status of a row is its index here, or 255 for any other status
+chart_file_statuses = ("knit", "cast on", "hem", "cast off", "split")
+
+
+def chart_file_record(max_spans):
+    """
+    The record of one row: its status code, the number of spans in it, the stitches in work and the spans,
+    padded on the right with zeros.
+    """
+    return np.dtype([("status", "u1"), ("count", "u1"), ("stitches", "<u2"), ("spans", "<i2", (max_spans,))])
+
+
+def write_chart_file(file, chart, gauge, style_name, pattern_piece_name):
+    """
+    Writes a needle chart as a binary chart file.
+    :param file: file name or binary file-like object
+    :param chart: NeedleChart
+    :param gauge: gauge tuple the chart was made at, stitches per 10 cm, rows per 10 cm
+    """
+    intercepts, counts = chart.run_intercepts()
+    if intercepts.size and (np.abs(intercepts).max() > np.iinfo(np.int16).max or counts.max() > 255):
+        raise ValueError(f"Module custom_knit_garments: {style_name} {pattern_piece_name} does not fit in a chart "
+                         f"file, which holds needles up to {np.iinfo(np.int16).max} and 255 spans a row.")
+    record = chart_file_record(intercepts.shape[1])
+    run_records = np.zeros(len(chart.runs), dtype=record)
+    run_records["count"] = counts
+    run_records["stitches"] = chart.bed.stitches_per_row(intercepts, counts)
+    run_records["spans"] = intercepts
+    records = np.repeat(run_records, chart.run_lengths())
+    for row, status in chart.row_status.items():
+        records["status"][row] = chart_file_statuses.index(status) if status in chart_file_statuses else 255
+    header = np.zeros(1, dtype=chart_file_header)
+    header["magic"] = chart_file_magic
+    header["version"] = chart_file_version
+    header["header_bytes"] = chart_file_header.itemsize
+    header["record_bytes"] = record.itemsize
+    header["max_spans"] = intercepts.shape[1]
+    header["rows"] = len(records)
+    header["gauge"] = gauge
+    header["left_needles"], header["right_needles"] = chart.bed.left_needles, chart.bed.right_needles
+    header["zero_needle"] = chart.bed.zero_needle
+    header["style"] = style_name.encode()[:32]
+    header["piece"] = pattern_piece_name.encode()[:32]
+    with contextlib.ExitStack() as stack:
+        if isinstance(file, (str, os.PathLike)):
+            file = stack.enter_context(open(file, "wb"))
+        file.write(header.tobytes())
+        file.write(records.tobytes())
+
+
+def read_chart_file(file_name):
+    """
+    Opens a binary chart file without reading its rows.
+    :return: (header, rows).  header is a dict of the header fields.  rows is a read only numpy.memmap of the row
+        records, see chart_file_record, so rows[n] reads only row n from the file.  The file can be shared by
+        any number of processes.
+    """
+    header = np.fromfile(file_name, dtype=chart_file_header, count=1)
+    if len(header) == 0 or header["magic"][0] != chart_file_magic:
+        raise ValueError(f"Module custom_knit_garments: {file_name} is not a chart file.")
+    if header["version"][0] != chart_file_version:
+        raise ValueError(f"Module custom_knit_garments: {file_name} is a version {header['version'][0]} chart file, "
+                         f"only version {chart_file_version} can be read.")
+    header = {name: header[name][0] for name in chart_file_header.names if name != "reserved"}
+    header = {name: value.decode() if isinstance(value, bytes) else
+              tuple(value.tolist()) if isinstance(value, np.ndarray) else value.item()
+              for name, value in header.items()}
+    header["zero_needle"] = bool(header["zero_needle"])
+    rows = np.memmap(file_name, dtype=chart_file_record(header["max_spans"]), mode="r",
+                     offset=header["header_bytes"], shape=(header["rows"],))
+    return header, rows
+
+
+# The instructions of a pattern piece as events, in the order they are knitted, see Garment.instruction_events.
+# Needles are machine needle numbers, left_needle to right_needle is the leftmost section of knitting.
+# carriage_position is the side the carriage starts on and carriage_direction the way it moves for the row.
+CastOn = namedtuple("CastOn", ["row", "left_needle", "right_needle", "stitches"])
+Hem = namedtuple("Hem", ["row", "hem_rows", "stitches"])
+# left_change and right_change are the stitches added at each edge, negative for a decrease
+Shaping = namedtuple("Shaping", ["row", "left_change", "right_change", "carriage_position", "carriage_direction",
+                                 "left_needle", "right_needle", "stitches"])
+# the first row of a split: cast off between the two cast_off_needles and hold hold_needles[0] to hold_needles[1]
+SplitHold = namedtuple("SplitHold", ["row", "cast_off_needles", "hold_needles", "carriage_position",
+                                     "carriage_direction", "left_needle", "right_needle", "stitches"])
+CastOff = namedtuple("CastOff", ["row"])
+OppositeSide = namedtuple("OppositeSide", ["split_row"])  # knit the held side from split_row
+Blocking = namedtuple("Blocking", [])  # after the last piece of the garment
+Finishing = namedtuple("Finishing", [])
+# One machine step of a pattern piece for a knitting machine controller, see Garment.controller_rows.  command is
+# cast_on, hem, shape, split_hold, cast_off or opposite_side.  left_needle to right_needle is the leftmost section
+# of knitting from row on, carriage is the side the carriage starts on, and hold_needles is None unless needles
+# go on hold.
+ControllerRow = namedtuple("ControllerRow", ["row", "command", "left_needle", "right_needle", "carriage",
+                                             "left_change", "right_change", "hold_needles"])
+
+
+def garment_artifact(name):
+    """
+    Decorator for the Garment methods that make a derived artifact, a pattern shape, needle chart, yarn
+    estimate or output file.  The method runs the first time it is called and later calls return the
+    remembered result, so any artifact can be asked for on its own and it is safe for one artifact to ask
+    for the ones it needs.  Methods that take a pattern piece name remember one result per piece.
+    Making an artifact is timed as a stage named name when the garment has a profiler.
+    Garment.invalidate forgets artifacts when something they are made from changes.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def make_once(self, pattern_piece_name=None):
+            artifacts = self.__dict__.setdefault("artifacts", {})
+            if (name, pattern_piece_name) not in artifacts:
+                with self.profiled(name, pattern_piece_name):
+                    if pattern_piece_name is None:
+                        artifacts[(name, None)] = method(self)
+                    else:
+                        artifacts[(name, pattern_piece_name)] = method(self, pattern_piece_name)
+            return artifacts[(name, pattern_piece_name)]
+        return make_once
+    return decorator
+
+
+class PieceView(Mapping):
+    """
+    Read only mapping of pattern piece name to make(pattern_piece_name), made when the piece is looked up.
+    """
+
+    def __init__(self, pieces, make):
+        self.pieces = pieces
+        self.make = make
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def __iter__(self):
+        return iter(self.pieces)
+
+    def __getitem__(self, pattern_piece_name):
+        if pattern_piece_name not in self.pieces:
+            raise KeyError(pattern_piece_name)
+        return self.make(pattern_piece_name)
+
+
+class ArtifactCache:
+    """
+    On disk cache of outputs, keyed by a hash of everything that went into making them.  Outputs are either
+    files (get and put) or bytes in memory (get_data and put_data).
+    Each entry is a directory holding the cached outputs as numbered files and a meta.json with any extra state the stage
+    needs back on a hit.  Entries are written to a temporary directory and renamed into place, so several
+    processes can share one cache.  When the cache grows past max_bytes the least recently used entries
+    are removed.
+    """
+
+    def __init__(self, directory="./cache", max_bytes=500 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*inputs):
+        # inputs must be json serializable.  dict order is kept because the order of places matters to shapes
+        return hashlib.sha256(json.dumps(inputs, default=repr).encode()).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key, file_names):
+        """
+        Copies the cached files for key to file_names.
+        :return: the metadata stored with the files, or None if key is not in the cache
+        """
+        entry = self.entry_path(key)
+        try:
+            with open(os.path.join(entry, "meta.json")) as meta_file:
+                metadata = json.load(meta_file)
+            for index, file_name in enumerate(file_names):
+                shutil.copyfile(os.path.join(entry, str(index)), file_name)
+            os.utime(entry)  # most recently used
+        except FileNotFoundError:
+            return None
+        return metadata
+
+    def get_data(self, key):
+        """
+        Reads the outputs cached for key into memory.
+        :return: (list of the cached outputs as bytes, the metadata stored with them), or None if key is not in
+            the cache
+        """
+        entry = self.entry_path(key)
+        try:
+            with open(os.path.join(entry, "meta.json")) as meta_file:
+                metadata = json.load(meta_file)
+            data = []
+            for index in range(len(os.listdir(entry)) - 1):
+                with open(os.path.join(entry, str(index)), "rb") as cached_file:
+                    data.append(cached_file.read())
+            os.utime(entry)  # most recently used
+        except FileNotFoundError:
+            return None
+        return data, metadata
+
+    def put(self, key, file_names, metadata=None):
+        def copy_files(new_entry):
+            for index, file_name in enumerate(file_names):
+                shutil.copyfile(file_name, os.path.join(new_entry, str(index)))
+        self.add_entry(key, copy_files, metadata)
+
+    def put_data(self, key, data, metadata=None):
+        """
+        :param data: list of the outputs to cache, as bytes
+        """
+        def write_data(new_entry):
+            for index, contents in enumerate(data):
+                with open(os.path.join(new_entry, str(index)), "wb") as cached_file:
+                    cached_file.write(contents)
+        self.add_entry(key, write_data, metadata)
+
+    def add_entry(self, key, write, metadata):
+        # write(directory) puts the numbered output files in the new entry directory
+        entry = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        new_entry = tempfile.mkdtemp(dir=os.path.dirname(entry))
+        write(new_entry)
+        with open(os.path.join(new_entry, "meta.json"), "w") as meta_file:
+            json.dump(metadata or {}, meta_file)
+        try:
+            os.replace(new_entry, entry)
+        except OSError:  # another process cached the same key first
+            shutil.rmtree(new_entry, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        # other processes sharing the cache may add, replace or evict entries during the scan, those are skipped
+        entries = []
+        for prefix in os.scandir(self.directory):
+            if not prefix.is_dir():
+                continue
+            try:
+                prefix_entries = list(os.scandir(prefix.path))
+            except FileNotFoundError:
+                continue
+            for entry in prefix_entries:
+                if entry.name.startswith("tmp"):  # still being written by add_entry
+                    continue
+                try:
+                    size = sum(cached.stat().st_size for cached in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except FileNotFoundError:
+                    continue
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_bytes -= size
+
+
+class StageProfiler:
+    """
+    Opt in record of the time and memory each stage of a garment takes, for finding where a slow batch spends
+    its time.  Set Garment.profiler, or profiler on one garment, to a StageProfiler and every artifact stage
+    (pattern_shape, needle_chart, yarn, plots, stitch_map, instructions, pdf, ...) is timed when it is made, once
+    per piece for the per piece stages.  A stage that asks for other stages is timed with them included,
+    self_seconds leaves them out.  Artifacts already made are not timed again.
+    counters adds up the work done on the hot paths: rows charted and counted, segment intercepts worked out by
+    row_intercepts, instruction rows written, stitches drawn and artifact_cache hits and misses.
+    With trace_memory, tracemalloc measures the memory each stage allocates.  It slows everything down, so it is
+    off by default, and with several threads the figures include what the other threads allocated.
+    When Garment.profiler is None, the default, nothing is recorded and the cost is one check per artifact made.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = []  # a dict for each stage made, in the order they finished
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()  # the stages being made on each thread, innermost last
+        self.started = time.perf_counter()
+        self.started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def close(self):
+        # stops tracemalloc if this profiler started it
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @contextlib.contextmanager
+    def stage(self, name, pattern_piece_name=None, garment=None):
+        """
+        Times the code in the with block as one stage.
+        :param garment: the title of the garment, to tell garments apart when they share a profiler
+        """
+        stack = self.local.__dict__.setdefault("stack", [])
+        frame = {"child_seconds": 0.0, "peak_bytes": 0, "start_bytes": 0}
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:  # keep the peak of the stage this one is part of before starting a new peak
+                stack[-1]["peak_bytes"] = max(stack[-1]["peak_bytes"], peak)
+            tracemalloc.reset_peak()
+            frame["start_bytes"] = current
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            record = {"stage": name, "piece": pattern_piece_name, "garment": garment, "start": start - self.started,
+                      "seconds": seconds, "self_seconds": seconds - frame["child_seconds"],
+                      "thread": threading.get_ident()}
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame["peak_bytes"])
+                record["allocated_bytes"] = current - frame["start_bytes"]  # still held when the stage ended
+                record["peak_bytes"] = peak - frame["start_bytes"]
+                if stack:
+                    stack[-1]["peak_bytes"] = max(stack[-1]["peak_bytes"], peak)
+            if stack:
+                stack[-1]["child_seconds"] += seconds
+            with self.lock:
+                self.stages.append(record)
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def totals(self):
+        # calls, seconds and self_seconds of each stage, added up over pieces and garments
+        totals = {}
+        for record in self.stages:
+            total = totals.setdefault(record["stage"], {"calls": 0, "seconds": 0.0, "self_seconds": 0.0})
+            total["calls"] += 1
+            total["seconds"] += record["seconds"]
+            total["self_seconds"] += record["self_seconds"]
+        return totals
+
+    def as_dict(self):
+        return {"stages": list(self.stages), "totals": self.totals(), "counters": dict(self.counters)}
+
+    def write_json(self, file_name):
+        with open(file_name, "w") as json_file:
+            json.dump(self.as_dict(), json_file, indent=1)
+
+    def write_chrome_trace(self, file_name):
+        """
+        Writes the stages in the trace event format, which chrome://tracing and https://ui.perfetto.dev show as
+        a timeline, with the counters at the end.
+        """
+        process = os.getpid()
+        events = [{"name": record["stage"] if record["piece"] is None else f"{record['stage']} {record['piece']}",
+                   "cat": "garment", "ph": "X", "pid": process, "tid": record["thread"],
+                   "ts": record["start"] * 1e6, "dur": record["seconds"] * 1e6,
+                   "args": {key: value for key, value in record.items() if key not in ("start", "seconds", "thread")}}
+                  for record in self.stages]
+        end = max((record["start"] + record["seconds"] for record in self.stages), default=0.0)
+        events.append({"name": "counters", "ph": "C", "pid": process, "tid": 0, "ts": end * 1e6,
+                       "args": dict(self.counters)})
+        with open(file_name, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+@functools.cache
+def module_digest():
+    # stands in for the code version in artifact cache keys
+    return file_digest(__file__)
+
+
+def file_digest(file_name):
+    with open(file_name, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+@functools.cache
+def style_params(style_file):
+    # each style sheet is read once, the read only mapping is shared by every figure drawn with it
+    import matplotlib
+    return types.MappingProxyType(dict(matplotlib.rc_params_from_file(os.path.abspath(style_file),
+                                                                      use_default_template=False)))
+
+
+# matplotlib.rcParams belongs to the whole process, so only one thread at a time may draw with a style
+style_lock = threading.RLock()
+
+
+@contextlib.contextmanager
+def style_context(*style_files):
+    """
+    Draws with the style sheets applied, in order, over the current rcParams.  rcParams are put back
+    afterwards.  Make and save figures inside the context, some rcParams are only read when saving.
+    Contexts can be nested, the inner style sheets are applied over the outer ones.
+    """
+    # the same figure always saves to the same svg, so svgs can be recognised by their hash, see PDFResources
+    import matplotlib
+    params = {"svg.hashsalt": "custom_knit_garments"}
+    for style_file in style_files:
+        params.update(style_params(style_file))
+    with style_lock, matplotlib.rc_context(params):
+        yield
+
+
+class PlotRenderer:
+    """
+    Draws the four garment over body plots for one body.
+    The figures, axes, grid lines and body outline are made once, the first time they are drawn.  Every
+    garment drawn after that only sets the data of its Front and Back lines, so all the garments for a
+    person share the same figures.  The figures are matplotlib.figure.Figure objects that pyplot never
+    sees, so they are freed with the renderer.  Use for_body to get the renderer for a body, it keeps the
+    renderers of the max_bodies most recently drawn bodies and closes the rest.
+    """
+    garment_style = "./images/garment.mplstyle"
+    cover_style = "./images/cover.mplstyle"
+    # plot number: (title, pieces drawn over the body, whether the body is drawn)
+    views = {
+        1: ("Front and Back over Body Map", ("Front", "Back"), True),
+        2: ("Front over Body Map", ("Front",), True),
+        3: ("Back over Body Map", ("Back",), True),
+        4: ("", ("Front", "Back"), False),  # the cover, no body, title or axes
+    }
+    max_bodies = 8
+    renderers = OrderedDict()  # (person, body outline): PlotRenderer, least recently used first
+
+    def __init__(self, body_shape):
+        self.body_shape = body_shape
+        self.figures = {}  # plot number: (figure, axes, {piece: Line2D})
+
+    @classmethod
+    def for_body(cls, body_shape):
+        key = (body_shape.person, body_shape.coords.tobytes())
+        with style_lock:
+            if key in cls.renderers:
+                cls.renderers.move_to_end(key)
+            else:
+                cls.renderers[key] = cls(body_shape)
+                while len(cls.renderers) > cls.max_bodies:
+                    cls.renderers.popitem(last=False)[1].close()
+            return cls.renderers[key]
+
+    @classmethod
+    def close_all(cls):
+        while cls.renderers:
+            cls.renderers.popitem()[1].close()
+
+    def close(self):
+        for fig, _, _ in self.figures.values():
+            fig.clear()
+        self.figures.clear()
+
+    def styles(self, plot_number):
+        return [self.garment_style, self.cover_style] if plot_number == 4 else [self.garment_style]
+
+    def make_figure(self, plot_number):
+        import matplotlib.figure
+        import matplotlib.ticker
+        title, pieces, with_body = self.views[plot_number]
+        with style_context(self.garment_style):
+            fig = matplotlib.figure.Figure()
+            ax = fig.add_subplot()
+            ax.set_aspect(1)
+            ax.tick_params(axis='x', labelrotation=90)
+            ax.xaxis.set_major_locator(matplotlib.ticker.MultipleLocator(10))
+            ax.yaxis.set_major_locator(matplotlib.ticker.MultipleLocator(10))
+            ax.set_ylabel(f"height in cm\nwaistline at zero")
+            ax.set_xlabel(f"width in cm\nbody center at zero")
+            if with_body:  # add body and set the grid lines
+                ax.axis(xmin=-80, xmax=80, ymin=-120, ymax=80)
+                ax.xaxis.set_major_locator(matplotlib.ticker.LinearLocator(numticks=9))
+                ax.yaxis.set_major_locator(matplotlib.ticker.LinearLocator(11))
+                self.body_shape.add_to_subplot(subplot=ax)
+            with style_context(*self.styles(plot_number)):
+                ax.set_title(title)
+                if not title:
+                    ax.set_axis_off()
+                # the garment lines are empty until a garment is drawn
+                lines = {piece: ax.plot([], [], label=piece)[0] for piece in pieces}
+                ax.legend()
+        return fig, ax, lines
+
+    def draw(self, pattern_shapes, file_name):
+        """
+        Saves the four plots of a garment as svg files.
+        :param pattern_shapes: mapping of piece name to {"pattern_shape": PatternPiece}, like Garment.pattern_shapes
+        :param file_name: function of the plot number that returns the file name to save it as
+        """
+        with style_lock:  # garments for the same body, drawn on other threads, share the figures
+            for plot_number in self.views:
+                if plot_number not in self.figures:
+                    self.figures[plot_number] = self.make_figure(plot_number)
+                fig, ax, lines = self.figures[plot_number]
+                for piece, line in lines.items():
+                    line.set_data(pattern_shapes[piece]["pattern_shape"].x_vals,
+                                  pattern_shapes[piece]["pattern_shape"].y_vals)
+                if not self.views[plot_number][2]:  # no body, so fit the axes to this garment
+                    ax.relim()
+                    ax.autoscale_view()
+                with style_context(*self.styles(plot_number)):
+                    fig.savefig(fname=file_name(plot_number), format="svg", metadata={"Date": None})
+
+
+def make_output_artifact(garment, stage, pattern_piece_name=None):
+    """
+    Makes one output artifact of garment on an output pool, see Garment.make_outputs.  On a process pool
+    garment is a copy, so the artifact is returned for the garment in the main process to remember.
+    """
+    if stage == "plots":
+        return garment.make_and_save_plot_svg_files()
+    if stage == "stitch_map":
+        return garment.make_and_save_stitch_map(pattern_piece_name)
+    raise ValueError(f"Module custom_knit_garments: {stage} is not made on the output pool.")
 
 
 class Garment:
@@ -273,7 +1041,7 @@ class Garment:
     to ignore unresolved body and person reference warnings for class Garment.  All subclasses
     shall have the following:
     a str called person which is the name of the person for whom the garment is designed to fit
-    a dict called body which contains the body data
+    a Measurements called body_data which contains the body data, never changed in place
     a tuple called gauge from which is derived:
         a float called spc which is the stitches per centimeter
         a float called rpc which is the rows per centimeter
@@ -281,126 +1049,202 @@ class Garment:
         the necessary pattern piece shapes required and referenced by piece names.
     a str called style_name which is the name of the garment style
     a float called hem_length_cm which is the length of the hem in centimeters.
+    Constructing a Garment does no work beyond the body data adjustments.  pattern_shapes, style and
+    total_yarn_meters are worked out the first time they are used, and the outputs (plots, stitch maps,
+    instructions and the pdf) are only made when their method or make_all is called.  Every derived
+    artifact is remembered, see garment_artifact.  Change the ease, gauge or hem length with set_ease_for_piece,
+    set_gauge_for_piece or set_hem_length so that only the artifacts made from them are made again.
+    Garment also has a NeedleBed called needle_bed, the machine bed every needle chart is made for.  The default
+    is a standard 200 needle bed.  Pass needle_bed to a subclass to knit on a wider bed.
+    Set profiler to a StageProfiler to see how long each stage takes, see StageProfiler.
     """
+    needle_bed = NeedleBed()
+    # what each artifact is made from, inputs (places_with_ease, gauge, hem_length_cm) or other artifacts.
+    # Artifacts are kept per pattern piece, except garment_artifacts which are made from every piece.
+    artifact_sources = {
+        "pattern_shape": ("places_with_ease", "hem_length_cm"),
+        "needle_chart": ("pattern_shape", "gauge", "hem_length_cm"),
+        "yarn": ("needle_chart",),
+        "stitch_map": ("needle_chart",),
+        "instruction_events": ("needle_chart",),
+        "instructions": ("instruction_events",),
+        "plots": ("pattern_shape",),
+        "total_yarn_meters": ("yarn",),
+        "pdf": ("plots", "stitch_map", "instructions", "total_yarn_meters"),
+    }
+    garment_artifacts = ("plots", "total_yarn_meters", "pdf")
+    # "svg" draws every stitch as a marker, "png" draws the stitch map as an image at stitch_map_dpi, which
+    # takes the same time and space whatever the number of stitches
+    stitch_map_format = "svg"
+    stitch_map_dpi = 200
+    # plots, stitch maps and instructions files are saved in results_folder, pdfs in patterns_folder
+    results_folder = "./results"
+    patterns_folder = "./patterns"
+    # make_all also saves each piece's needle chart as a binary chart file in results_folder when True, see
+    # write_chart_file
+    chart_files = False
+    # write_instructions also saves each piece's instructions as a .txt file in results_folder when True.
+    # The pdf is made from the instructions in memory and does not need the files.
+    instructions_files = True
+    # garment_pdf.PDFResources shared by every garment, made with the first pdf
+    pdf_resources = None
+    # set to an ArtifactCache to reuse plots, stitch maps, instructions and pdfs made from the same inputs
+    artifact_cache = None
+    # the body_data places every subclass needs, the rest of its places are worked out from these
+    required_places = ()
+    # set to a StageProfiler to time each stage and count the work on the hot paths
+    profiler = None
+    # make_all draws the plots and stitch maps on a pool of output_workers when output_pool is "thread" or
+    # "process", while the instructions are written.  None draws them one after another.  matplotlib rcParams
+    # belong to the whole process, so threads take turns drawing and processes draw at the same time.
+    output_pool = None
+    output_workers = None
+    output_pools = {}  # (output_pool, output_workers): executor, shared by every garment
+    # class settings a garment takes with it to an output worker process, see __getstate__
+    output_settings = ("needle_bed", "results_folder", "patterns_folder", "stitch_map_format", "stitch_map_dpi",
+                       "instructions_files", "chart_files", "artifact_cache")
+    # files, besides this module, whose contents change the outputs of each stage
+    stage_files = {
+        "plots": ("./images/garment.mplstyle", "./images/cover.mplstyle"),
+        "stitch_map": ("./images/stitchchart.mplstyle",),
+        "instructions": (),
+        "pdf": ("./images/garment.mplstyle", "./images/cover.mplstyle", "./images/stitchchart.mplstyle",
+                "Brazilia.ttf", os.path.join(os.path.dirname(os.path.abspath(__file__)), "garment_pdf.py")),
+    }
+
+    def invalidate(self, changed, piece=None):
+        """
+        Forgets every artifact made from changed, directly or through other artifacts, so it is made again
+        the next time it is needed.
+        :param changed: the name of the input or artifact that changed
+        :param piece: the pattern piece name that changed, or None for every piece
+        """
+        artifacts = self.__dict__.setdefault("artifacts", {})
+        for name, sources in self.artifact_sources.items():
+            if changed in sources:
+                if name in self.garment_artifacts:
+                    artifacts.pop((name, None), None)
+                    self.invalidate(name)
+                else:
+                    for pattern_piece_name in ([piece] if piece else self.required_pattern_pieces):
+                        artifacts.pop((name, pattern_piece_name), None)
+                    self.invalidate(name, piece)
+
+    def __getstate__(self):
+        # a garment sent to another process keeps the settings made on its class, but not its profiler
+        state = {name: getattr(self, name) for name in self.output_settings}
+        state.update(self.__dict__)
+        state.pop("profiler", None)
+        return state
+
+    def profiled(self, stage, pattern_piece_name=None):
+        # times the with block as a stage when the garment has a profiler
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.stage(stage, pattern_piece_name, self.title)
+
+    def count(self, counter, amount=1):
+        if self.profiler is not None:
+            self.profiler.count(counter, amount)
 
     def set_gauge_for_piece(self, piece, stitches_per_10_cm, rows_per_10_cm):
         self.required_pattern_pieces[piece]['gauge'] = (stitches_per_10_cm, rows_per_10_cm)
-        # TODO - figure out how to update everything this affects
+        self.invalidate("gauge", piece)
+
+    def set_ease_for_piece(self, piece, place, ease_percent):
+        self.required_pattern_pieces[piece]['places_with_ease'][place] = ease_percent
+        self.invalidate("places_with_ease", piece)
+
+    def set_hem_length(self, hem_length_cm):
+        self.hem_length_cm = hem_length_cm
+        self.add_hem(self.hem_place, self.hem_straighten_cm)
+        self.invalidate("hem_length_cm")
 
     def add_shoulder_extension(self, shoulder_extension_percent):
         # adjust shoulder width using percent distance from outer shoulder to shoulder neck
-        self.body_data['shoulderArmhole'] = {key: self.body_data['outerShoulder'][key]
-                                             for key in self.body_data['outerShoulder']}
-        self.body_data['shoulderArmhole']['meas'] = (((self.body_data['shoulderNeck']['meas'] -
-                                                       self.body_data['outerShoulder']['meas']) *
-                                                      (shoulder_extension_percent / -100))
-                                                     + self.body_data['outerShoulder']['meas'])
-        self.body_data['shoulderArmhole']['height'] = (((self.body_data['shoulderNeck']['height'] -
-                                                         self.body_data['outerShoulder']['height']) *
-                                                        (shoulder_extension_percent / -100))
-                                                       + self.body_data['outerShoulder']['height'])
+        outer_shoulder, shoulder_neck = self.body_data['outerShoulder'], self.body_data['shoulderNeck']
+        self.body_data = self.body_data.with_places(shoulderArmhole=dict(
+            outer_shoulder,
+            meas=(((shoulder_neck['meas'] - outer_shoulder['meas']) * (shoulder_extension_percent / -100))
+                  + outer_shoulder['meas']),
+            height=(((shoulder_neck['height'] - outer_shoulder['height']) * (shoulder_extension_percent / -100))
+                    + outer_shoulder['height'])))
 
     def add_neck_ease(self, neck_ease_percent):
         # adjust neckline width using percent distance from outer shoulder to shoulder neck
-        self.body_data['neckShoulder'] = {key: self.body_data['outerShoulder'][key]
-                                          for key in self.body_data['outerShoulder']}
-        self.body_data['neckShoulder']['meas'] = (((self.body_data['shoulderNeck']['meas'] -
-                                                    self.body_data['outerShoulder']['meas']) *
-                                                   ((100 - neck_ease_percent) / 100))
-                                                  + self.body_data['outerShoulder']['meas'])
-        self.body_data['neckShoulder']['height'] = (((self.body_data['shoulderNeck']['height'] -
-                                                      self.body_data['outerShoulder']['height']) *
-                                                     ((100 - neck_ease_percent) / 100))
-                                                    + self.body_data['outerShoulder']['height'])
+        outer_shoulder, shoulder_neck = self.body_data['outerShoulder'], self.body_data['shoulderNeck']
+        self.body_data = self.body_data.with_places(neckShoulder=dict(
+            outer_shoulder,
+            meas=(((shoulder_neck['meas'] - outer_shoulder['meas']) * ((100 - neck_ease_percent) / 100))
+                  + outer_shoulder['meas']),
+            height=(((shoulder_neck['height'] - outer_shoulder['height']) * ((100 - neck_ease_percent) / 100))
+                    + outer_shoulder['height'])))
 
     def straighten_neck_shoulder(self, length_cm):
-        self.body_data['neckShoulderDrop'] = {key: self.body_data['neckShoulder'][key]
-                                              for key in self.body_data['neckShoulder']}
-        self.body_data['neckShoulderDrop']['height'] -= length_cm / 2
+        neck_shoulder = self.body_data['neckShoulder']
+        self.body_data = self.body_data.with_places(
+            neckShoulderDrop=dict(neck_shoulder, height=neck_shoulder['height'] - length_cm / 2))
 
     def lower_front_neckline(self, percent_to_bust):
-        depth = (self.body_data['frontNeck']['height'] - self.body_data['fullBust']['height']) * percent_to_bust / 100
-        self.body_data['frontNeck']['height'] -= depth
+        front_neck = self.body_data['frontNeck']
+        depth = (front_neck['height'] - self.body_data['fullBust']['height']) * percent_to_bust / 100
+        self.body_data = self.body_data.with_places(frontNeck=dict(front_neck, height=front_neck['height'] - depth))
 
     def lower_back_neckline(self, depth_cm):
-        self.body_data['backNeck']['height'] -= depth_cm
+        back_neck = self.body_data['backNeck']
+        self.body_data = self.body_data.with_places(backNeck=dict(back_neck, height=back_neck['height'] - depth_cm))
 
     def lower_underarm(self, depth_cm):
-        self.body_data['underArm0']['height'] -= depth_cm
-        self.body_data['underArm1']['height'] -= depth_cm
-        self.body_data['underArm2']['height'] -= depth_cm
+        self.body_data = self.body_data.with_places(**{
+            place: dict(self.body_data[place], height=self.body_data[place]['height'] - depth_cm)
+            for place in ('underArm0', 'underArm1', 'underArm2')})
 
     def straighten_waist(self, length_cm):
-        self.body_data['waist1'] = {key: self.body_data['waist'][key] for key in self.body_data['waist']}
-        self.body_data['waist2'] = {key: self.body_data['waist'][key] for key in self.body_data['waist']}
-        self.body_data['waist1']['height'] -= length_cm / 2
-        self.body_data['waist2']['height'] += length_cm / 2
+        waist = self.body_data['waist']
+        self.body_data = self.body_data.with_places(waist1=dict(waist, height=waist['height'] - length_cm / 2),
+                                                    waist2=dict(waist, height=waist['height'] + length_cm / 2))
 
     def add_hem(self, place, straighten_cm):
-        self.body_data[place + 'Hem'] = {key: self.body_data[place][key] for key in self.body_data[place]}
-        self.body_data[place + 'HemStraighten'] = {key: self.body_data[place][key] for key in self.body_data[place]}
-        self.body_data[place + 'Hem']['height'] += self.hem_length_cm
-        self.body_data[place + 'HemStraighten']['height'] += (straighten_cm + self.hem_length_cm)
+        self.hem_place, self.hem_straighten_cm = place, straighten_cm  # kept for set_hem_length
+        hem_place = self.body_data[place]
+        self.body_data = self.body_data.with_places(**{
+            place + 'Hem': dict(hem_place, height=hem_place['height'] + self.hem_length_cm),
+            place + 'HemStraighten': dict(hem_place, height=hem_place['height'] + (straighten_cm + self.hem_length_cm))})
 
     def create_style_point(self, place, ease, left=True, circumferential=True):
+        # returns the x, y coordinates in cm of the point
         if left and circumferential:
-            point = Point((-self.body_data[place]["meas"] / 4) * (1 + ease / 100), self.body_data[place]["height"])
-            return point
+            return (-self.body_data[place]["meas"] / 4) * (1 + ease / 100), self.body_data[place]["height"]
         if not left and circumferential:
-            point = Point((self.body_data[place]["meas"] / 4) * (1 + ease / 100), self.body_data[place]["height"])
-            return point
+            return (self.body_data[place]["meas"] / 4) * (1 + ease / 100), self.body_data[place]["height"]
         if left and not circumferential:
-            point = Point((-self.body_data[place]["meas"] / 2) * (1 + ease / 100), self.body_data[place]["height"])
-            return point
+            return (-self.body_data[place]["meas"] / 2) * (1 + ease / 100), self.body_data[place]["height"]
         if not left and not circumferential:
-            point = Point((self.body_data[place]["meas"] / 2) * (1 + ease / 100), self.body_data[place]["height"])
-            return point
+            return (self.body_data[place]["meas"] / 2) * (1 + ease / 100), self.body_data[place]["height"]
         raise Exception("class Garment method create_style_point definition has a problem")
 
     def create_pattern_shape(self, places_with_ease):
-        points = []
+        coords = []
         for place in places_with_ease:
-            points.append(self.create_style_point(place, places_with_ease[place],
+            coords.append(self.create_style_point(place, places_with_ease[place],
                                                   circumferential=self.body_data[place]["circumferential"]))
         for place in reversed(places_with_ease):
             # if place != "hem_length_cm":
-            points.append(self.create_style_point(place, places_with_ease[place], left=False,
+            coords.append(self.create_style_point(place, places_with_ease[place], left=False,
                                                   circumferential=self.body_data[place]["circumferential"]))
-        pattern_piece_shape = PatternPiece(points)
+        pattern_piece_shape = PatternPiece(np.array(coords, dtype=float))
         return pattern_piece_shape
 
-    def create_needle_chart(self, pattern_piece_name):
+    @staticmethod
+    def row_heights_cm(shape, gauge):
+        # the height in cm of every row of a shape knitted at gauge, from row 0 at the bottom of the shape
+        row_height_cm = 10 / gauge[1]
+        y_vals = shape.y_vals
+        total_rows = int((max(y_vals) - min(y_vals)) / row_height_cm)
+        return np.arange(0, total_rows + 1) * row_height_cm + min(y_vals)
 
-        def all_stitches(row):
-            needle_states = get_needle_states(row)
-            sts = [needle for needle in needle_states if needle_states[needle] == "B" or needle_states[needle] == "E"]
-            return sts
-
-        def get_needle_states(row):
-            # needle_states = {needle: get_needle_status(needle, row) for needle in range(-100, 101) if needle != 0}
-            ints = get_segment_intercepts(row)
-            needle_states = {}
-            for needle in range(-100, 101):
-                a = "A"  # out_of_work
-                b = "B"  # in_work
-                c = "C"  # selected
-                e = "E"  # Not really... keeps track of stitches on split sections
-                if needle != 0:
-                    status = a
-                    if ints[0] <= needle <= ints[1]:
-                        status = b
-                    if len(ints) > 3:
-                        if ints[2] <= needle <= ints[3]:
-                            status = e
-                    needle_states.update({needle: status})
-            return needle_states
-
-        def get_segment_intercepts(row):
-            y = row * row_height_cm + min(y_vals)
-            intercepts = [int(segment.x_intercept(y) / stitch_width_cm) for
-                          segment in shape.segments if segment.contains_y(y)]
-            segment_intercepts = np.unique(intercepts)
-            return segment_intercepts
+    @garment_artifact("needle_chart")
+    def create_needle_chart(self, pattern_piece_name):
 
         def get_row_status(row):
             status = "knit"
@@ -420,161 +1264,303 @@ class Garment:
         stitch_width_cm = 10 / gauge[0]
         row_height_cm = 10 / gauge[1]
         hem_row = int(self.hem_length_cm / row_height_cm)
-        y_vals = np.array(shape.y_vals)
-        total_rows = int((max(y_vals) - min(shape.y_vals)) / row_height_cm)
+        row_heights_cm = self.row_heights_cm(shape, gauge)
+        total_rows = len(row_heights_cm) - 1
         split_row = False
-        needle_chart = {row: {"row_status": get_row_status(row),
-                              "intercepts": get_segment_intercepts(row),
-                              "all": all_stitches(row),
-                              "needle_states": get_needle_states(row)}
-                        for row in range(0, total_rows + 1)
-                        }
+        intercepts, counts = row_intercepts(shape.edges, row_heights_cm, stitch_width_cm)
+        self.count("rows_charted", len(row_heights_cm))
+        self.count("segment_intercepts", len(row_heights_cm) * len(shape.edges))
+        self.needle_bed.check_fits(intercepts, counts, f"{self.style_name} {pattern_piece_name}")
+        # only the cast on, hem and cast off rows can have a status other than knit
+        row_status = {row: get_row_status(row) for row in sorted({0, hem_row, total_rows}) if row <= total_rows}
+        needle_chart = NeedleChart.from_intercepts(intercepts, counts, row_status, self.needle_bed)
         return needle_chart
 
-    def write_instructions(self):
-        def write_instructions_for_cast_on():
-            print("CAST ON USING WASTE YARN:\n"
-                  f"Begin with the carriage on the {cp[1]} side. "
-                  f"Place needles from position {leftmost_needle} to position {rightmost_needle}, "
-                  f"into working position.  Thread the carriage with waste yarn and fasten a "
-                  f"clothespin to the yarn end.  Push the carriage {cd[1]}, to cast on  {total_stitches} "
-                  f"total needles.  Push the knitted row against the needle bed and slowly knit one "
-                  f"more row.  Hang claw weights along the knitting to evenly distribute weight along "
-                  f"the knitting.  Knit for a couple of inches with waste yarn.  With the carriage on "
-                  f"the {cp[1]} side, break the waste yarn and secure the tail with a clothespin.  "
-                  f"Thread the carriage with your main yarn.\n"
-                  f"Set the row counter to zero.", file=file_name)
-
-        def write_instructions_for_hem():
-            print(f"These {hem_rows} rows form the reverse side of the hem.  Set the row counter to zero.  "
-                  f"Knit {row} more rows to form the front side of the hem. "
-                  "Pull all working needles forward and remove the claw weights.  Taking care not "
-                  f"to drop stitches from the extended needles, rehang the hem by placing the purl "
-                  f"bumps from the first row of main yarn stitches on the needles.  You will be short "
-                  f"one purl bump.  This is expected and will not cause a problem.  Push the knitting "
-                  f"against the needle bed and rehang the claw weights.  \n"
-                  f"Loosen the tension and slowly "
-                  f"knit 1 row {cd[1]}.  Reset the tension.\n"
-                  f"{total_stitches} total stitches.", file=file_name)
-
-        def write_split_row_instructions():
-            print(f"Cast off between needles {needles[1]} and {needles[2]}.\n"
-                  f"Place needles {needles[2]} through {needles[3]} on hold.", file=file_name)
-
-        def write_change_instructions():
-            if leftmost_needle != last_leftmost_needle:  # if there is a change on the left
-                if leftmost_needle > last_leftmost_needle:  # if the left is decreasing
-                    print(f"\tDecrease {leftmost_needle - last_leftmost_needle} stitch(es) at left edge.",
-                          file=file_name)
+    def plot_file_name(self, plot_number):
+        return f"{self.results_folder}/{self.title} plot {plot_number}.svg"
+
+    def stitch_map_file_name(self, pattern_piece_name):
+        return (f"{self.results_folder}/stitch_map_{self.style_name}_{pattern_piece_name}_{self.person}_"
+                f"{self.gauge_string}.{self.stitch_map_format}")
+
+    def chart_file_name(self, pattern_piece_name):
+        return (f"{self.results_folder}/chart_{self.style_name}_{pattern_piece_name}_{self.person}_"
+                f"{self.gauge_string}.kchart")
+
+    def save_chart_file(self, pattern_piece_name):
+        file_name = self.chart_file_name(pattern_piece_name)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with self.profiled("chart_file", pattern_piece_name):
+            write_chart_file(file_name, self.create_needle_chart(pattern_piece_name),
+                             self.required_pattern_pieces[pattern_piece_name]["gauge"], self.style_name,
+                             pattern_piece_name)
+
+    def instructions_file_name(self, pattern_piece_name):
+        return (f"{self.results_folder}/{self.style_name} {pattern_piece_name} for {self.person} at "
+                f"{self.gauge_string}.txt")
+
+    def pdf_file_name(self):
+        return f"{self.patterns_folder}/{self.title}.pdf"
+
+    def cache_key(self, stage, pattern_piece_name):
+        """
+        The artifact_cache key of a stage, a hash of the stage inputs: this module's code, the files in
+        stage_files, the body data, hem length, needle bed and the ease, gauge and number to make of
+        pattern_piece_name, or of every piece when pattern_piece_name is None.
+        """
+        pieces = [pattern_piece_name] if pattern_piece_name else list(self.required_pattern_pieces)
+        return self.artifact_cache.key(
+            stage, pattern_piece_name, module_digest(), [file_digest(file_name) for file_name in self.stage_files[stage]],
+            type(self).__name__, self.person, self.title, list(self.required_pattern_pieces),
+            self.body_data.as_dict(), self.hem_length_cm, repr(self.needle_bed), self.stitch_map_format,
+            self.stitch_map_dpi,
+            [[self.required_pattern_pieces[piece]["places_with_ease"], self.required_pattern_pieces[piece]["gauge"],
+              self.required_pattern_pieces[piece]["number_to_make"]] for piece in pieces])
+
+    def cached_output_files(self, stage, pattern_piece_name, file_names, make, metadata=None):
+        """
+        Copies the output files of a stage from artifact_cache, or makes them with make() and caches them.
+        The folders of file_names are made if they do not exist.
+        :param metadata: function returning a json serializable dict to store with the files
+        :return: the stored metadata dict on a cache hit, otherwise None
+        """
+        for file_name in file_names:
+            os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        if self.artifact_cache is None:
+            make()
+            return None
+        key = self.cache_key(stage, pattern_piece_name)
+        cached = self.artifact_cache.get(key, file_names)
+        self.count("cache_misses" if cached is None else "cache_hits")
+        if cached is None:
+            make()
+            self.artifact_cache.put(key, file_names, metadata() if metadata else None)
+        return cached
+
+    def cached_output_data(self, stage, pattern_piece_name, make, metadata=None):
+        """
+        Like cached_output_files, for stages that make their outputs in memory.
+        :param make: function returning the list of outputs of the stage, as bytes
+        :param metadata: function returning a json serializable dict to store with the outputs
+        :return: (list of outputs, the stored metadata dict on a cache hit, otherwise None)
+        """
+        if self.artifact_cache is None:
+            return make(), None
+        key = self.cache_key(stage, pattern_piece_name)
+        cached = self.artifact_cache.get_data(key)
+        self.count("cache_misses" if cached is None else "cache_hits")
+        if cached is None:
+            data = make()
+            self.artifact_cache.put_data(key, data, metadata() if metadata else None)
+            return data, None
+        return cached
+
+    @garment_artifact("instructions")
+    def write_piece_instructions(self, pattern_piece_name):
+        (text,), _ = self.cached_output_data("instructions", pattern_piece_name,
+                                             lambda: [self.write_piece_instructions_text(pattern_piece_name).encode()])
+        return text.decode()
+
+    @garment_artifact("instruction_events")
+    def piece_instruction_events(self, pattern_piece_name):
+        # the instruction events of a piece, worked out once for every renderer
+        return list(self.instruction_events(pattern_piece_name))
+
+    def instruction_events(self, pattern_piece_name):
+        """
+        Works out what the knitter does on each row of a pattern piece, in one pass over the rows where the
+        knitting changes.  The needle chart is not changed.
+        :return: generator of CastOn, Hem, Shaping, SplitHold, CastOff, OppositeSide, Blocking and Finishing events
+        """
+        gauge = self.required_pattern_pieces[pattern_piece_name]["gauge"]
+        hem_rows = int(self.hem_length_cm * gauge[1] / 10)
+        chart = self.create_needle_chart(pattern_piece_name)
+        cp = ["left", "right"]  # carriage position
+        cd = ["from left to right", "from right to left"]  # carriage direction
+        last_leftmost_needle = 0
+        last_rightmost_needle = 0
+        split = False  # set the default split condition to False
+        split_counter = 0
+        shaping_rows = chart.shaping_rows()
+        self.count("instruction_rows", len(shaping_rows))
+        for row in shaping_rows:  # rows inside a run of identical rows never change anything
+            needles = chart.run_for_row(row).spans.tolist()
+            status = chart.row_status.get(row, "knit")
+            leftmost_needle, rightmost_needle = needles[0], needles[1]  # leftmost section of knitting
+            total_stitches = rightmost_needle - leftmost_needle
+            if status == "cast on":
+                yield CastOn(row, leftmost_needle, rightmost_needle, total_stitches)
+                last_leftmost_needle = leftmost_needle
+                last_rightmost_needle = rightmost_needle
+            if status == "hem":
+                yield Hem(row, hem_rows, total_stitches)
+                last_leftmost_needle = leftmost_needle
+                last_rightmost_needle = rightmost_needle
+            if status == "cast off":
+                yield CastOff(row)
+            elif leftmost_needle != last_leftmost_needle or rightmost_needle != last_rightmost_needle:
+                if row % 2 != 0:  # if the row number is odd
+                    carriage_position, carriage_direction = cp[0], cd[0]  # the carriage starts on the left
+                else:  # row number is even
+                    carriage_position, carriage_direction = cp[1], cd[1]  # and carriage starts on the right
+                if len(needles) == 2:
+                    split = False
+                if len(needles) > 3 and split is False:  # compare if this is the first row of a split
+                    split = True  # if there are more than 2 unique x intercepts there is a split
+                    split_counter = row
+                    yield SplitHold(row, (needles[1], needles[2]), (needles[2], needles[3]), carriage_position,
+                                    carriage_direction, leftmost_needle, rightmost_needle, total_stitches)
                 else:
-                    print(f"\tIncrease {last_leftmost_needle - leftmost_needle} stitch(es) at left edge.",
-                          file=file_name)
-            if rightmost_needle != last_rightmost_needle:  # if there is a change on the right
-                if rightmost_needle < last_rightmost_needle:  # if the right is decreasing
-                    print(f"\tDecrease {last_rightmost_needle - rightmost_needle} stitch(es) at right edge.",
-                          file=file_name)
-                else:
-                    print(f"\tIncrease {rightmost_needle - last_rightmost_needle} stitch(es) at right edge.",
-                          file=file_name)
-
-        def write_cast_off_instructions():
-            print(f"\nCAST OFF REMAINING STITCHES.", file=file_name)
-
-        def write_split_instructions():
-            print(f"\n COMPLETE OPPOSITE SIDE:\n"
-                  f"Reset counter to {split_counter}, and knit opposite side, reversing "
-                  f"left and right instructions.", file=file_name)
-
-        def write_blocking_instructions():
-            print(f"\n BLOCKING:\n"
-                  f""f"Remove waste yarn.  Machine knitting needs to rest for at least 8 hours before blocking. "
-                  f"This is due to the amount of stretch necessary to knit by machine.  "
-                  f"Gently stretch your newly knitted fabric from top to bottom to encourage the stitches to relax.  "
-                  f"Place on a flat smooth surface like a counter top and let it relax, preferably overnight.  After "
-                  f"resting, soak your knitted piece and gently squeeze out excess water.  Never wring your knitting!  "
-                  f"Lay flat on a clean towel and gently align to finished dimensions.  When dry, recheck dimensions, "
-                  f"using gentle steam if necessary.\n", file=file_name)
-
-        def write_finishing_instructions():
-            print(f"\n FINISHING:\n"
-                  f"Seam pieces together along sides.  Pick up stitches along neckline and add finishing of choice.  "
-                  f"Insert sleeves in the round, or for sleeveless garments, pick up stitches at armhole and add "
-                  f"finishing of choice.  ENJOY <3", file=file_name)
-
-            file_name.close()
+                    yield Shaping(row, last_leftmost_needle - leftmost_needle, rightmost_needle - last_rightmost_needle,
+                                  carriage_position, carriage_direction, leftmost_needle, rightmost_needle,
+                                  total_stitches)
+                last_leftmost_needle = leftmost_needle
+                last_rightmost_needle = rightmost_needle
+        if split is True:
+            yield OppositeSide(split_counter)
+        if pattern_piece_name == list(self.required_pattern_pieces)[-1]:  # after the last piece
+            yield Blocking()
+            yield Finishing()
+
+    # the row status the stitch table shows for the row of each event
+    event_row_status = {CastOn: "See Instructions for Cast On", Hem: "See Hem Instructions",
+                        CastOff: "See Instructions for Cast Off", Shaping: "Increase/Decrease",
+                        SplitHold: "See Instructions for Split/Hold"}
+
+    def instruction_row_status(self, pattern_piece_name):
+        # the chart row statuses, with the rows the instructions refer to marked as they are in the stitch table
+        row_status = dict(self.create_needle_chart(pattern_piece_name).row_status)
+        row_status.update((event.row, self.event_row_status[type(event)])
+                          for event in self.piece_instruction_events(pattern_piece_name)
+                          if type(event) in self.event_row_status)
+        return row_status
+
+    def write_piece_instructions_json(self, pattern_piece_name):
+        # the instruction events as a json list of {"event": type, field: value}
+        return json.dumps([{"event": type(event).__name__, **event._asdict()}
+                           for event in self.piece_instruction_events(pattern_piece_name)])
+
+    def controller_rows(self, pattern_piece_name):
+        """
+        The instruction events of a piece as the steps a knitting machine controller takes, one ControllerRow per
+        row where the knitting changes.  Blocking and finishing are not done on the machine and are left out.
+        :return: generator of ControllerRow
+        """
+        left_needle = right_needle = None
+        for event in self.piece_instruction_events(pattern_piece_name):
+            if isinstance(event, CastOn):
+                left_needle, right_needle = event.left_needle, event.right_needle
+                yield ControllerRow(event.row, "cast_on", left_needle, right_needle, "right", 0, 0, None)
+            elif isinstance(event, Hem):
+                yield ControllerRow(event.row, "hem", left_needle, right_needle, "right", 0, 0, None)
+            elif isinstance(event, Shaping):
+                left_needle, right_needle = event.left_needle, event.right_needle
+                yield ControllerRow(event.row, "shape", left_needle, right_needle, event.carriage_position,
+                                    event.left_change, event.right_change, None)
+            elif isinstance(event, SplitHold):
+                left_change, right_change = left_needle - event.left_needle, event.right_needle - right_needle
+                left_needle, right_needle = event.left_needle, event.right_needle
+                yield ControllerRow(event.row, "split_hold", left_needle, right_needle, event.carriage_position,
+                                    left_change, right_change, event.hold_needles)
+            elif isinstance(event, CastOff):
+                yield ControllerRow(event.row, "cast_off", left_needle, right_needle, None, 0, 0, None)
+            elif isinstance(event, OppositeSide):
+                yield ControllerRow(event.split_row, "opposite_side", None, None, None, 0, 0, None)
+
+    def write_piece_instructions_controller(self, pattern_piece_name):
+        # the controller rows of a piece as csv, one line per ControllerRow, hold_needles as two columns
+        with io.StringIO() as text:
+            writer = csv.writer(text, lineterminator="\n")
+            writer.writerow(ControllerRow._fields[:-1] + ("hold_from", "hold_to"))
+            for step in self.controller_rows(pattern_piece_name):
+                writer.writerow(step[:-1] + (step.hold_needles or (None, None)))
+            return text.getvalue()
+
+    def write_piece_instructions_text(self, pattern_piece_name):
+        # the instructions of a piece in words, from its instruction events
+        cd = ["from left to right", "from right to left"]  # carriage direction
 
         def write_row_counter_instructions():
-            print(f"KNIT UNTIL ROW COUNTER READS {row}:", file=file_name)
+            print(f"KNIT UNTIL ROW COUNTER READS {event.row}:", file=text)
 
         def write_carriage_instructions():
-            print(f"With carriage on the {carriage_position}, move carriage {carriage_direction}, "
-                  f"knitting needles from {leftmost_needle} to {rightmost_needle}.\n"
-                  f"{total_stitches} total stitches.", file=file_name)
+            print(f"With carriage on the {event.carriage_position}, move carriage {event.carriage_direction}, "
+                  f"knitting needles from {event.left_needle} to {event.right_needle}.\n"
+                  f"{event.stitches} total stitches.", file=text)
+
+        with io.StringIO() as text:
+            for event in self.piece_instruction_events(pattern_piece_name):
+                if isinstance(event, CastOn):
+                    print("CAST ON USING WASTE YARN:\n"
+                          f"Begin with the carriage on the right side. "
+                          f"Place needles from position {event.left_needle} to position {event.right_needle}, "
+                          f"into working position.  Thread the carriage with waste yarn and fasten a "
+                          f"clothespin to the yarn end.  Push the carriage {cd[1]}, to cast on  {event.stitches} "
+                          f"total needles.  Push the knitted row against the needle bed and slowly knit one "
+                          f"more row.  Hang claw weights along the knitting to evenly distribute weight along "
+                          f"the knitting.  Knit for a couple of inches with waste yarn.  With the carriage on "
+                          f"the right side, break the waste yarn and secure the tail with a clothespin.  "
+                          f"Thread the carriage with your main yarn.\n"
+                          f"Set the row counter to zero.", file=text)
+                elif isinstance(event, Hem):
+                    write_row_counter_instructions()
+                    print(f"These {event.hem_rows} rows form the reverse side of the hem.  Set the row counter to "
+                          f"zero.  Knit {event.row} more rows to form the front side of the hem. "
+                          "Pull all working needles forward and remove the claw weights.  Taking care not "
+                          f"to drop stitches from the extended needles, rehang the hem by placing the purl "
+                          f"bumps from the first row of main yarn stitches on the needles.  You will be short "
+                          f"one purl bump.  This is expected and will not cause a problem.  Push the knitting "
+                          f"against the needle bed and rehang the claw weights.  \n"
+                          f"Loosen the tension and slowly "
+                          f"knit 1 row {cd[1]}.  Reset the tension.\n"
+                          f"{event.stitches} total stitches.", file=text)
+                elif isinstance(event, CastOff):
+                    print(f"\nCAST OFF REMAINING STITCHES.", file=text)
+                elif isinstance(event, SplitHold):
+                    write_row_counter_instructions()
+                    print(f"Cast off between needles {event.cast_off_needles[0]} and {event.cast_off_needles[1]}.\n"
+                          f"Place needles {event.hold_needles[0]} through {event.hold_needles[1]} on hold.", file=text)
+                    write_carriage_instructions()
+                elif isinstance(event, Shaping):
+                    write_row_counter_instructions()
+                    for edge, change in (("left", event.left_change), ("right", event.right_change)):
+                        if change < 0:
+                            print(f"\tDecrease {-change} stitch(es) at {edge} edge.", file=text)
+                        elif change > 0:
+                            print(f"\tIncrease {change} stitch(es) at {edge} edge.", file=text)
+                    write_carriage_instructions()
+                elif isinstance(event, OppositeSide):
+                    print(f"\n COMPLETE OPPOSITE SIDE:\n"
+                          f"Reset counter to {event.split_row}, and knit opposite side, reversing "
+                          f"left and right instructions.", file=text)
+                elif isinstance(event, Blocking):
+                    print(f"\n BLOCKING:\n"
+                          f""f"Remove waste yarn.  Machine knitting needs to rest for at least 8 hours before "
+                          f"blocking. This is due to the amount of stretch necessary to knit by machine.  "
+                          f"Gently stretch your newly knitted fabric from top to bottom to encourage the stitches to "
+                          f"relax.  Place on a flat smooth surface like a counter top and let it relax, preferably "
+                          f"overnight.  After resting, soak your knitted piece and gently squeeze out excess water.  "
+                          f"Never wring your knitting!  Lay flat on a clean towel and gently align to finished "
+                          f"dimensions.  When dry, recheck dimensions, using gentle steam if necessary.\n", file=text)
+                elif isinstance(event, Finishing):
+                    print(f"\n FINISHING:\n"
+                          f"Seam pieces together along sides.  Pick up stitches along neckline and add finishing of "
+                          f"choice.  Insert sleeves in the round, or for sleeveless garments, pick up stitches at "
+                          f"armhole and add finishing of choice.  ENJOY <3", file=text)
+            return text.getvalue()
 
+    def write_instructions(self):
         for pattern_piece_name in self.required_pattern_pieces:
-            file_name = open(f"./results/{self.style_name} {pattern_piece_name} for "
-                             f"{self.person} at {self.gauge_string}.txt", "w")
-            gauge = self.required_pattern_pieces[pattern_piece_name]["gauge"]
-            hem_rows = int(self.hem_length_cm * gauge[1] / 10)
-            chart = self.style[pattern_piece_name]["needle_chart"]
-            cp = ["left", "right"]  # carriage position
-            cd = ["from left to right", "from right to left"]  # carriage direction
-            last_leftmost_needle = 0
-            last_rightmost_needle = 0
-            count = 0  # the number of rows with the same amount of stitches
-            split = False  # set the default split condition to False
-            split_row = False  # set the default split_row condition to False
-            split_counter = 0
-            for row in chart:  # iterates through each row
-                needles = chart[row]["intercepts"]
-                status = chart[row]["row_status"]
-                leftmost_needle, rightmost_needle = needles[0], needles[1]  # leftmost section of knitting
-                total_stitches = rightmost_needle - leftmost_needle
-                if status == "cast on":
-                    write_instructions_for_cast_on()
-                    last_leftmost_needle = leftmost_needle
-                    last_rightmost_needle = rightmost_needle
-                    self.style[pattern_piece_name]["needle_chart"][row]['row_status'] = 'See Instructions for Cast On'
-                if status == "hem":
-                    write_row_counter_instructions()
-                    write_instructions_for_hem()
-                    last_leftmost_needle = leftmost_needle
-                    last_rightmost_needle = rightmost_needle
-                    self.style[pattern_piece_name]["needle_chart"][row]['row_status'] = "See Hem Instructions"
-                if status == "cast off":
-                    write_cast_off_instructions()
-                    self.style[pattern_piece_name]["needle_chart"][row]['row_status'] = 'See Instructions for Cast Off'
-                else:
-                    if leftmost_needle == last_leftmost_needle and rightmost_needle == last_rightmost_needle:
-                        count += 1  # keep track of how many rows to knit until something changes
-                    else:  # once there is a change
-                        self.style[pattern_piece_name]["needle_chart"][row]['row_status'] = 'Increase/Decrease'
-                        if row % 2 != 0:  # if the row number is odd
-                            carriage_position, carriage_direction = cp[0], cd[0]  # the carriage starts on the left
-                        else:  # row number is even
-                            carriage_position, carriage_direction = cp[1], cd[1]  # and carriage starts on the right
-                        write_row_counter_instructions()
-                        if len(needles) == 2:
-                            split = False
-                        if len(needles) > 3 and split is False:  # compare if this is the first row of a split
-                            self.style[pattern_piece_name]["needle_chart"][row]['row_status'] = ('See Instructions for '
-                                                                                                 'Split/Hold')
-                            split_row = True
-                            split = True  # if there are more than 2 unique x intercepts there is a split
-                        if split_row is True:
-                            split_counter = row
-                            write_split_row_instructions()
-                            split_row = False
-                        else:
-                            write_change_instructions()
-                        write_carriage_instructions()
-                        last_leftmost_needle = leftmost_needle
-                        last_rightmost_needle = rightmost_needle
-                        count = 0
-            if split is True:
-                write_split_instructions()
-        write_blocking_instructions()
-        write_finishing_instructions()
+            self.write_piece_instructions(pattern_piece_name)
+            if self.instructions_files:
+                self.save_instructions_file(pattern_piece_name)
+
+    def save_instructions_file(self, pattern_piece_name):
+        file_name = self.instructions_file_name(pattern_piece_name)
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        text = self.write_piece_instructions(pattern_piece_name)
+        with self.profiled("instructions_file", pattern_piece_name), open(file_name, "w") as instructions_file:
+            instructions_file.write(text)
 
     def add_garment_to_subplot(self, subplot, piece):  # sets artists for garment over body plots
         # plt.style.use('./images/garment.mplstyle')
@@ -599,49 +1585,34 @@ class Garment:
                      label=piece)
         subplot.legend()
 
+    @garment_artifact("plots")
     def make_and_save_plot_svg_files(self):
-        for x in range(1, 5):
-            plt.style.use("./images/garment.mplstyle")
-            fig, ax = plt.subplots()
-            ax.set_aspect(1)
-            ax.tick_params(axis='x', labelrotation=90)
-            ax.xaxis.set_major_locator(matplotlib.ticker.MultipleLocator(10))
-            ax.yaxis.set_major_locator(matplotlib.ticker.MultipleLocator(10))
-            ax.set_ylabel(f"height in cm\nwaistline at zero")
-            ax.set_xlabel(f"width in cm\nbody center at zero")
-            if x != 4:  # add body to plots 1 - 3 and set the grid lines
-                ax.axis(xmin=-80, xmax=80, ymin=-120, ymax=80)
-                ax.xaxis.set_major_locator(matplotlib.ticker.LinearLocator(numticks=9))
-                ax.yaxis.set_major_locator(matplotlib.ticker.LinearLocator(11))
-                self.body_shape.add_to_subplot(subplot=ax)
-            if x == 1:  # add front and back garment to plot 1 and add title
-                plt.style.use("./images/garment.mplstyle")
-                ax.set_title("Front and Back over Body Map")
-                self.add_garment_to_subplot(subplot=ax, piece="Front")
-                self.add_garment_to_subplot(subplot=ax, piece="Back")
-            if x == 2:  # add garment front to plot 2 and add title
-                ax.set_title("Front over Body Map")
-                self.add_garment_to_subplot(subplot=ax, piece="Front")
-            if x == 3:  # add back to plot 3 and add title
-                ax.set_title("Back over Body Map")
-                self.add_garment_to_subplot(subplot=ax, piece="Back")
-            if x == 4:  # add front and back to plot 4 for the cover. Remove title and axes
-                plt.style.use("./images/cover.mplstyle")
-                ax.set_title("")
-                ax.set_axis_off()
-                self.add_garment_to_subplot(subplot=ax, piece="Front")
-                self.add_garment_to_subplot(subplot=ax, piece="Back")
-            fig.savefig(fname=f"./results/{self.title} plot {x}.svg", format="svg")
+        self.cached_output_files("plots", None, [self.plot_file_name(x) for x in range(1, 5)],
+                                 self.draw_plot_svg_files)
+
+    def draw_plot_svg_files(self):
+        PlotRenderer.for_body(self.body_shape).draw(self.pattern_shapes, self.plot_file_name)
 
     def make_and_save_stitch_maps(self):
         for pattern_piece_name in self.required_pattern_pieces:
-            plt.style.use("images/stitchchart.mplstyle")
-            x_vals = [x for row in self.style[pattern_piece_name]['needle_chart']
-                      for x in self.style[pattern_piece_name]["needle_chart"][row]["all"]]
-            y_vals = [row for row in self.style[pattern_piece_name]['needle_chart']
-                      for x in self.style[pattern_piece_name]["needle_chart"][row]["all"]]
-            gauge = self.required_pattern_pieces[pattern_piece_name]['gauge']
-            ratio = gauge[0] / gauge[1]
+            self.make_and_save_stitch_map(pattern_piece_name)
+
+    @garment_artifact("stitch_map")
+    def make_and_save_stitch_map(self, pattern_piece_name):
+        self.cached_output_files("stitch_map", pattern_piece_name, [self.stitch_map_file_name(pattern_piece_name)],
+                                 lambda: self.draw_stitch_map(pattern_piece_name))
+
+    def draw_stitch_map(self, pattern_piece_name):
+        import matplotlib.colors
+        import matplotlib.figure
+        import matplotlib.ticker
+        needle_states = self.create_needle_chart(pattern_piece_name).needle_states()
+        y_vals, columns = np.nonzero(needle_states.in_work())
+        x_vals = needle_states.bed.needles[columns]
+        self.count("stitches_drawn", len(x_vals))
+        gauge = self.required_pattern_pieces[pattern_piece_name]['gauge']
+        ratio = gauge[0] / gauge[1]
+        with style_context("./images/stitchchart.mplstyle"):
             fig = matplotlib.figure.Figure(figsize=[8, 10])
             ax = fig.add_subplot(111)
             # fig, ax = plt.subplots(nrows=1, ncols=1, figsize=[8, 10])
@@ -659,104 +1630,312 @@ class Garment:
             ax.set_xlabel("machine needles")
             ax.set_ylabel("row number")
             ax.set_aspect(ratio)
-            ax.plot(x_vals,
-                    y_vals,
-                    # marker='^',
-                    # markersize=0.5,
-                    # alpha=0.5,
-                    # mec="hotpink",
-                    # mfc="hotpink",
-                    # linestyle="",
-                    label=pattern_piece_name)
+            if self.stitch_map_format == "png":
+                # one pixel per stitch, so the file size does not grow with the number of stitches
+                used = needle_states.needles_ever_used()
+                first_needle, last_needle = used.min(initial=0), used.max(initial=0)
+                image = np.zeros((len(needle_states), last_needle - first_needle + 1), dtype=np.uint8)
+                image[y_vals, x_vals - first_needle] = 1
+                ax.imshow(image,
+                          cmap=matplotlib.colors.ListedColormap([matplotlib.rcParams["lines.markerfacecolor"],
+                                                                 matplotlib.rcParams["lines.markeredgecolor"]]),
+                          vmin=0,
+                          vmax=1,
+                          interpolation="nearest",
+                          origin="lower",
+                          aspect=ratio,
+                          extent=(first_needle - .5, last_needle + .5, -.5, len(needle_states) - .5),
+                          label=pattern_piece_name)
+            else:
+                ax.plot(x_vals,
+                        y_vals,
+                        # marker='^',
+                        # markersize=0.5,
+                        # alpha=0.5,
+                        # mec="hotpink",
+                        # mfc="hotpink",
+                        # linestyle="",
+                        label=pattern_piece_name)
             # ax.legend()
             # ax.grid(visible=True, which='major', color='grey', linestyle='solid', linewidth=1.0)
             ax.grid(visible=True, which='minor', color='#cccccc', linestyle='-', linewidth=1, alpha=0.5)
             ax.set_title(f"{pattern_piece_name} Machine Needle Map by Row")
-            fig.savefig(fname=f"./results/stitch_map_{self.style_name}_{pattern_piece_name}_{self.person}"
-                              f"_{self.gauge_string}.svg", format="svg")
-            if __name__ == "__main__":
-                print(f"{self.style_name} {pattern_piece_name} for {self.person} at {self.gauge_string} "
-                      f"stitch plot.svg saved to results")
+            fig.savefig(fname=self.stitch_map_file_name(pattern_piece_name), format=self.stitch_map_format,
+                        dpi=self.stitch_map_dpi if self.stitch_map_format == "png" else "figure",
+                        metadata={"Date": None} if self.stitch_map_format == "svg" else None)
+        if __name__ == "__main__":
+            print(f"{self.style_name} {pattern_piece_name} for {self.person} at {self.gauge_string} "
+                  f"stitch plot.{self.stitch_map_format} saved to results")
 
     def create_data_for_stitch_table(self, pattern_piece_name):
-        table_data = [["col A", "col B"], ["row 1 col A", "row1 col B"], ["row 2 col A", "row2 col B"]]
-        column_names = ["ROW", "STATUS", "NEEDLES IN WORK"]
-        nc = self.style[pattern_piece_name]['needle_chart']
-        # ints = nc[key]['intercepts']
-        table_data = [[f"Row {key}", nc[key]['row_status'], str(nc[key]['intercepts'])]
-                      for key in nc.keys() if nc[key]['row_status'] != 'knit']
-        table_data.reverse()
-        table_data.append(column_names)
-        table_data.reverse()
+        """
+        The stitch table of a pattern piece.  Each row with a status, such as the cast on, hem or a shaping row,
+        has a table row of its own, and the plain knit rows between them are one table row for each stretch that
+        knits the same, e.g. ["Rows 41-58", "knit", "112 needles, -56 to 56"].  So the table grows with the
+        shaping changes of the piece, not its rows.
+        :return: list of table rows of cell text, the column names first
+        """
+        column_names = ["ROWS", "STATUS", "NEEDLES IN WORK"]
+        chart = self.create_needle_chart(pattern_piece_name)
+        row_status = self.instruction_row_status(pattern_piece_name)
+        # a status is for its row alone, the rows after it start a new stretch
+        starts = set(chart.shaping_rows()).union(row_status, (row + 1 for row in row_status))
+        starts = sorted(row for row in starts if row < len(chart))
+        self.count("stitch_table_rows", len(starts))
+        table_data = [column_names]
+        for row, next_row in zip(starts, starts[1:] + [len(chart)]):
+            spans = chart.run_for_row(row).spans
+            # the needles of every section, so the count always matches the sections printed
+            stitches = int(chart.bed.needles_between(spans[0::2], spans[1::2]).sum())
+            rows = f"Row {row}" if next_row - row == 1 else f"Rows {row}-{next_row - 1}"
+            sections = ", ".join(f"{low} to {high}" for low, high in zip(spans[0::2].tolist(), spans[1::2].tolist()))
+            table_data.append([rows, row_status.get(row, "knit"), f"{stitches} needles, {sections}"])
         return table_data
 
-    def create_pdf(self):
-        pdf = PDF(orientation='P', format='letter', unit='mm')
-        pdf.add_font(family="Brazilia", style="", fname="Brazilia.ttf")
+    def create_pdf(self, file=None):
+        """
+        Makes the pattern pdf, or reuses the one already made.
+        :param file: also write the pdf here, a file name or a binary file-like object such as a web response
+        :return: the pdf as bytes
+        """
+        pdf_bytes = self.make_pdf()
+        if isinstance(file, (str, os.PathLike)):
+            os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+            with open(file, "wb") as pdf_file:
+                pdf_file.write(pdf_bytes)
+        elif file is not None:
+            file.write(pdf_bytes)
+        return pdf_bytes
+
+    @garment_artifact("pdf")
+    def make_pdf(self):
+        (pdf_bytes,), _ = self.cached_output_data("pdf", None, lambda: [self.write_pdf_bytes()])
+        return pdf_bytes
+
+    def write_pdf_bytes(self):
+        self.make_and_save_plot_svg_files()
+        self.make_and_save_stitch_maps()
+        for pattern_piece_name in self.required_pattern_pieces:
+            self.write_piece_instructions(pattern_piece_name)
+        import garment_pdf
+        if Garment.pdf_resources is None:
+            Garment.pdf_resources = garment_pdf.PDFResources()
+        pdf = garment_pdf.PDF(orientation='P', format='letter', unit='mm', resources=self.pdf_resources)
         pdf.set_title(f"{self.style_name} for {self.person}")
         pdf.set_author("Custom Knit Garments")
         pdf.set_margins(10, 15, 10)
         pdf.add_page()
-        pdf.print_cover_page(image=f"./results/{self.title} plot 4.svg",
+        pdf.print_cover_page(image=self.plot_file_name(4),
                              cover_text=f"{self.cover_text} yarn estimate: {self.total_yarn_meters} meters.")
         for pattern_piece_name in self.required_pattern_pieces:
-            stitch_map = f'./results/stitch_map_{self.style_name}_{pattern_piece_name}_{self.person}_{self.gauge_string}.svg'
             pdf.print_chapter(num=self.required_pattern_pieces[pattern_piece_name]["number_to_make"],
                               title=f"{pattern_piece_name}",
-                              file_name=f"./results/{self.style_name} {pattern_piece_name} for {self.person}"
-                                        f" at {self.gauge_string}.txt")
+                              text=self.write_piece_instructions(pattern_piece_name))
             pdf.print_stitch_table_page(td=self.create_data_for_stitch_table(pattern_piece_name=pattern_piece_name))
-            pdf.print_stitch_map(image=stitch_map)
-        pdf.output(f"./patterns/{self.title}.pdf")
+            pdf.print_stitch_map(image=self.stitch_map_file_name(pattern_piece_name))
+        return bytes(pdf.output())
+
+    @staticmethod
+    def yarn_meters_for_stitches(gauge, total_stitches):
+        # estimate yarn length per stitch using gauge
+        stitch_width = 10 / gauge[0]
+        stitch_height = 10 / gauge[1]
+        stitch_length_meters = (stitch_width + stitch_height) * 2 / 100
+        return int(stitch_length_meters * total_stitches)
+
+    def gauge_sweep(self, gauges):
+        """
+        Yarn and stitch counts for this garment at many gauges, without making any needle charts or outputs.
+        The pattern shapes are only made once, and the rows of every gauge are found in one pass per piece.
+        :param gauges: list of gauge tuples, stitches per 10 cm, rows per 10 cm
+        :return: dict of gauge: {"yarn_meters": total yarn for the garment,
+                                 "stitches": {piece name: total stitches in one piece},
+                                 "rows": {piece name: number of rows in the piece},
+                                 "error": None}
+            For a gauge the garment does not fit the needle bed at, yarn_meters is None, the pieces that do not
+            fit are left out of stitches and rows, and error says why.
+        """
+        gauges = list(dict.fromkeys(tuple(gauge) for gauge in gauges))  # each gauge once, in the order given
+        sweep = {gauge: {"yarn_meters": 0, "stitches": {}, "rows": {}, "error": None} for gauge in gauges}
+        for pattern_piece_name in self.required_pattern_pieces:
+            for gauge, counted in zip(gauges, self.count_piece_stitches(pattern_piece_name, gauges)):
+                if isinstance(counted, ValueError):
+                    sweep[gauge]["yarn_meters"] = None
+                    sweep[gauge]["error"] = sweep[gauge]["error"] or str(counted)
+                    continue
+                total_stitches, rows = counted
+                sweep[gauge]["stitches"][pattern_piece_name] = total_stitches
+                sweep[gauge]["rows"][pattern_piece_name] = rows
+                if sweep[gauge]["yarn_meters"] is not None:
+                    sweep[gauge]["yarn_meters"] += (
+                        self.yarn_meters_for_stitches(gauge, total_stitches) *
+                        self.required_pattern_pieces[pattern_piece_name]["number_to_make"])
+        return sweep
+
+    def count_piece_stitches(self, pattern_piece_name, gauges):
+        """
+        Stitches of a pattern piece at many gauges, added up from the needle spans of every row, the same count
+        the needle chart of the piece would give.  The rows of every gauge are found in one pass.
+        :param gauges: list of gauge tuples, stitches per 10 cm, rows per 10 cm
+        :return: list of (total stitches in one piece, number of rows), one per gauge, or the ValueError of
+            NeedleBed.check_fits for a gauge the piece does not fit the needle bed at
+        """
+        shape = self.pattern_shapes[pattern_piece_name]["pattern_shape"]
+        row_heights = [self.row_heights_cm(shape, gauge) for gauge in gauges]
+        stitch_widths = [np.full(len(heights), 10 / gauge[0]) for heights, gauge in zip(row_heights, gauges)]
+        intercepts, counts = row_intercepts(shape.edges, np.concatenate(row_heights), np.concatenate(stitch_widths))
+        self.count("rows_counted", len(counts))
+        self.count("segment_intercepts", len(counts) * len(shape.edges))
+        stitches_per_row = self.needle_bed.stitches_per_row(intercepts, counts)
+        piece_stitches = []
+        first_row = 0
+        for gauge, heights in zip(gauges, row_heights):
+            rows = slice(first_row, first_row + len(heights))
+            first_row += len(heights)
+            try:
+                self.needle_bed.check_fits(intercepts[rows], counts[rows],
+                                           f"{self.style_name} {pattern_piece_name} at gauge {gauge[0]} {gauge[1]}")
+            except ValueError as error:  # the other gauges are still counted
+                piece_stitches.append(error)
+                continue
+            piece_stitches.append((int(stitches_per_row[rows].sum()), len(heights)))
+        return piece_stitches
+
+    def estimate_yarn_meters(self, gauge=None, approximate=False):
+        """
+        Yarn for the garment worked out straight from the pattern shapes, without making any needle charts.
+        :param gauge: gauge tuple, stitches per 10 cm, rows per 10 cm, or None for the gauge of each piece
+        :param approximate: False adds up the stitches of every row from its needle spans, which gives the same
+            meters as total_yarn_meters at the same gauge.  True takes the stitches from the area of each pattern
+            shape, which is quicker still but does not round to whole stitches and rows like the knitting does.
+        :return: int meters of yarn, or None if a piece does not fit the needle bed at gauge, so a loop over many
+            gauges can go on past the ones that do not fit
+        """
+        yarn_meters = 0
+        for pattern_piece_name, piece in self.required_pattern_pieces.items():
+            piece_gauge = tuple(gauge or piece["gauge"])
+            if approximate:
+                shape = self.pattern_shapes[pattern_piece_name]["pattern_shape"]
+                # the widest the piece gets, in needles, as row_intercepts would find them
+                widest = np.trunc(np.array([[shape.coords[:, 0].min(), shape.coords[:, 0].max()]]) /
+                                  (10 / piece_gauge[0])).astype(np.int64)
+                try:
+                    self.needle_bed.check_fits(widest, np.array([2]), f"{self.style_name} {pattern_piece_name}")
+                except ValueError:
+                    return None
+                total_stitches = int(shape.area * piece_gauge[0] * piece_gauge[1] / 100)
+            else:
+                counted = self.count_piece_stitches(pattern_piece_name, [piece_gauge])[0]
+                if isinstance(counted, ValueError):
+                    return None
+                total_stitches = counted[0]
+            yarn_meters += self.yarn_meters_for_stitches(piece_gauge, total_stitches) * piece["number_to_make"]
+        return yarn_meters
 
-    def create_style(self):
-        style = {pattern_piece_name: {
-            "pattern_shape": self.pattern_shapes[pattern_piece_name]["pattern_shape"],  # shape obj in cm
-            "number_to_make": self.required_pattern_pieces[pattern_piece_name]["number_to_make"],
-            "yarn_meters_per_piece": int(0),  # populated with self.calculate_required_yarn_amount_meters(),
-            "needle_chart": self.create_needle_chart(pattern_piece_name)
-        } for pattern_piece_name in self.required_pattern_pieces}
-        return style
+    @garment_artifact("yarn")
+    def calculate_piece_yarn_meters(self, pattern_piece_name):
+        gauge = self.required_pattern_pieces[pattern_piece_name]['gauge']
+        chart = self.create_needle_chart(pattern_piece_name)
+        total_stitches = int(chart.run_states().stitches_per_row() @ chart.run_lengths())
+        return self.yarn_meters_for_stitches(gauge, total_stitches)
 
+    @garment_artifact("total_yarn_meters")
     def calculate_required_yarn_amount_meters(self):
         yarn_meters = 0
         for piece in self.required_pattern_pieces:
-            # estimate yarn length per stitch using piece gauge
-            gauge = self.required_pattern_pieces[piece]['gauge']
-            stitch_width = 10 / gauge[0]
-            stitch_height = 10 / gauge[1]
-            stitch_length_meters = (stitch_width + stitch_height) * 2 / 100
-            total_stitches = len([x for row in self.style[piece]['needle_chart']
-                                  for x in self.style[piece]["needle_chart"][row]["all"]])
-            yarn_length = int(stitch_length_meters * total_stitches)
-            self.style[piece]["yarn_meters_per_piece"] = yarn_length
-            yarn_meters += yarn_length * self.required_pattern_pieces[piece]["number_to_make"]
+            yarn_meters += self.calculate_piece_yarn_meters(piece) * self.required_pattern_pieces[piece]["number_to_make"]
         return yarn_meters
 
-    def make_all(self):  # used in init of Garment subclasses
-        self.pattern_shapes = {
-            key: {"pattern_shape": self.create_pattern_shape(self.required_pattern_pieces[key]["places_with_ease"])}
-            for key in self.required_pattern_pieces}
-        self.style = self.create_style()
-        self.total_yarn_meters = self.calculate_required_yarn_amount_meters()
+    @garment_artifact("pattern_shape")
+    def make_pattern_shape(self, pattern_piece_name):
+        return self.create_pattern_shape(self.required_pattern_pieces[pattern_piece_name]["places_with_ease"])
+
+    @property
+    def pattern_shapes(self):
+        return PieceView(self.required_pattern_pieces, lambda pattern_piece_name: {
+            "pattern_shape": self.make_pattern_shape(pattern_piece_name)})
+
+    @property
+    def style(self):
+        return PieceView(self.required_pattern_pieces, lambda pattern_piece_name: {
+            "pattern_shape": self.make_pattern_shape(pattern_piece_name),  # shape obj in cm
+            "number_to_make": self.required_pattern_pieces[pattern_piece_name]["number_to_make"],
+            "yarn_meters_per_piece": self.calculate_piece_yarn_meters(pattern_piece_name),
+            "needle_chart": self.create_needle_chart(pattern_piece_name)})
+
+    @property
+    def total_yarn_meters(self):
+        return self.calculate_required_yarn_amount_meters()
+
+    def make_all(self):  # makes every output, only artifacts that are missing or out of date are made again
         # self.make_and_save_plot_canvas()  # this is for multiple plots on one canvas
-        self.make_and_save_plot_svg_files()
-        self.make_and_save_stitch_maps()
+        self.make_outputs()
+        self.create_pdf(self.pdf_file_name())
+
+    def make_outputs(self):
+        """
+        Makes the plots, stitch maps and instructions the pdf is made from, and the chart files when chart_files
+        is set.  With output_pool set, the plots and each stitch map are drawn on the pool while the instructions
+        are written, and all of them are finished before this returns.  The pattern shapes and needle charts are
+        made first, here, the drawing only reads them.
+        """
+        if self.chart_files:
+            for pattern_piece_name in self.required_pattern_pieces:
+                self.save_chart_file(pattern_piece_name)
+        if self.output_pool is None:
+            self.make_and_save_plot_svg_files()
+            self.make_and_save_stitch_maps()
+            self.write_instructions()
+            return
+        for pattern_piece_name in self.required_pattern_pieces:
+            self.create_needle_chart(pattern_piece_name)  # also makes the pattern shape
+        artifacts = self.__dict__.setdefault("artifacts", {})
+        tasks = [("plots", None)] + [("stitch_map", pattern_piece_name)
+                                     for pattern_piece_name in self.required_pattern_pieces]
+        executor = self.output_executor()
+        futures = {task: executor.submit(make_output_artifact, self, *task) for task in tasks if task not in artifacts}
         self.write_instructions()
-        self.create_pdf()
+        for task, future in futures.items():
+            artifacts[task] = future.result()
+
+    def output_executor(self):
+        # the output pool, made the first time it is used and kept for later garments
+        key = (self.output_pool, self.output_workers)
+        if key not in Garment.output_pools:
+            if self.output_pool == "thread":
+                Garment.output_pools[key] = concurrent.futures.ThreadPoolExecutor(max_workers=self.output_workers)
+            elif self.output_pool == "process":
+                # new interpreters rather than forks, forking while another thread draws can deadlock the child
+                Garment.output_pools[key] = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.output_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                raise ValueError(f"Module custom_knit_garments: output_pool must be None, \"thread\" or "
+                                 f"\"process\", not {self.output_pool!r}.")
+        return Garment.output_pools[key]
+
+    @staticmethod
+    def close_output_pools():
+        while Garment.output_pools:
+            Garment.output_pools.popitem()[1].shutdown()
 
 
 class Tshirt(Garment):
-    def __init__(self, body_data, person, gauge=(10, 10)):
+    required_places = ("lowHip", "waist", "fullBust", "underArm0", "underArm1", "underArm2", "outerShoulder",
+                       "shoulderNeck", "frontNeck", "backNeck")
+
+    def __init__(self, body_data, person, gauge=(10, 10), needle_bed=None):
         '''
-        :param body_data: imported from measurement data file
+        :param body_data: imported from measurement data file, or Measurements, it is not changed
         :param person: imported from measurement data file
         :param gauge: type tuple stitches per 10 cm, rows per 10 cm
+        :param needle_bed: NeedleBed of the knitting machine, defaults to Garment.needle_bed
         '''
+        if needle_bed is not None:
+            self.needle_bed = needle_bed
         self.style_name = "T Shirt"
         self.person = person
-        self.body_data = body_data
-        self.body_shape = Body(body_data, person)
+        self.body_data = Measurements(body_data)
+        self.body_shape = Body(self.body_data, person)
         self.gauge_string = f'gauge {gauge[0]} {gauge[1]}'
         self.title = f'{self.style_name} for {self.person} at {self.gauge_string}'
         self.straighten_waist(5)  # cm
@@ -804,33 +1983,44 @@ class Tshirt(Garment):
                      "number_to_make": int(1),
                      "gauge": gauge}  # uses default but there is a method to change this
         }
-        self.cover_text = (f"Custom Fitted Tee\n\n"
-                           f"Crew neckline finished with custom edging of choice\n\n"
-                           f"Sleeveless Design finished with custom edging of choice\n\n"
-                           f"Fitted waist with  {front_places_with_ease_percent['waist1']}% "
-                           f"ease at the front waist "
-                           f"and {back_places_with_ease_percent['waist1']}% "
-                           f"ease at the back waist\n\n"
-                           f"Custom Fitted Low Hip Length with {front_places_with_ease_percent['lowHip']} "
-                           f"% ease at front low hip and {back_places_with_ease_percent['lowHip']} "
-                           f"% ease at back low hip\n\n"
-                           f"{self.hem_length_cm} cm self hem\n\n"
-                           f"Customized instructions specifically designed for "
-                           f"machine gauge of {self.gauge_string}.\n\n")
-        self.make_all()
+
+    @property
+    def cover_text(self):
+        # made from the current ease and hem length, so it is up to date after set_ease_for_piece or set_hem_length
+        front_places_with_ease_percent = self.required_pattern_pieces["Front"]["places_with_ease"]
+        back_places_with_ease_percent = self.required_pattern_pieces["Back"]["places_with_ease"]
+        return (f"Custom Fitted Tee\n\n"
+                f"Crew neckline finished with custom edging of choice\n\n"
+                f"Sleeveless Design finished with custom edging of choice\n\n"
+                f"Fitted waist with  {front_places_with_ease_percent['waist1']}% "
+                f"ease at the front waist "
+                f"and {back_places_with_ease_percent['waist1']}% "
+                f"ease at the back waist\n\n"
+                f"Custom Fitted Low Hip Length with {front_places_with_ease_percent['lowHip']} "
+                f"% ease at front low hip and {back_places_with_ease_percent['lowHip']} "
+                f"% ease at back low hip\n\n"
+                f"{self.hem_length_cm} cm self hem\n\n"
+                f"Customized instructions specifically designed for "
+                f"machine gauge of {self.gauge_string}.\n\n")
 
 
 class Dress(Garment):
-    def __init__(self, body_data, person, gauge=(10, 10)):
+    required_places = ("belowKnees", "fullThighs", "seatDepth", "lowHip", "highHip", "waist", "fullBust", "underArm0",
+                       "underArm1", "underArm2", "outerShoulder", "shoulderNeck", "frontNeck", "backNeck")
+
+    def __init__(self, body_data, person, gauge=(10, 10), needle_bed=None):
         '''
-        :param body_data: imported from measurement data file
+        :param body_data: imported from measurement data file, or Measurements, it is not changed
         :param person: imported from measurement data file
         :param gauge: type tuple stitches per 10 cm, rows per 10 cm
+        :param needle_bed: NeedleBed of the knitting machine, defaults to Garment.needle_bed
         '''
+        if needle_bed is not None:
+            self.needle_bed = needle_bed
         self.style_name = "Dress"
         self.person = person
-        self.body_data = body_data
-        self.body_shape = Body(body_data, person)
+        self.body_data = Measurements(body_data)
+        self.body_shape = Body(self.body_data, person)
         self.gauge_string = f'gauge {gauge[0]} {gauge[1]}'
         self.title = f'{self.style_name} for {self.person} at {self.gauge_string}'
         self.straighten_waist(5)  # cm
@@ -886,33 +2076,43 @@ class Dress(Garment):
                      "number_to_make": int(1),
                      "gauge": gauge}  # uses default but there is a method to change this
         }
-        self.cover_text = (f"Custom Fitted Dress\n\n"
-                           f"V neckline finished with edging of choice\n\n"
-                           f"Close fitting waist with  {front_places_with_ease_percent['waist1']}% "
-                           f"ease at the front waist "
-                           f"and {back_places_with_ease_percent['waist1']}% "
-                           f"ease at the back waist\n\n"
-                           f"Custom Fitted Hip Curve with {front_places_with_ease_percent['highHip']} "
-                           f"% ease at front hip and {back_places_with_ease_percent['highHip']} "
-                           f"% ease at back hip\n\n"
-                           f"Below Knee Length\n\n"
-                           f"{self.hem_length_cm} cm self hem\n\n"
-                           f"Customized instructions specifically designed for "
-                           f"machine gauge of {self.gauge_string}.\n\n")
-        self.make_all()
+
+    @property
+    def cover_text(self):
+        # made from the current ease and hem length, so it is up to date after set_ease_for_piece or set_hem_length
+        front_places_with_ease_percent = self.required_pattern_pieces["Front"]["places_with_ease"]
+        back_places_with_ease_percent = self.required_pattern_pieces["Back"]["places_with_ease"]
+        return (f"Custom Fitted Dress\n\n"
+                f"V neckline finished with edging of choice\n\n"
+                f"Close fitting waist with  {front_places_with_ease_percent['waist1']}% "
+                f"ease at the front waist "
+                f"and {back_places_with_ease_percent['waist1']}% "
+                f"ease at the back waist\n\n"
+                f"Custom Fitted Hip Curve with {front_places_with_ease_percent.get('highHip', 0)} "
+                f"% ease at front hip and {back_places_with_ease_percent['highHip']} "
+                f"% ease at back hip\n\n"
+                f"Below Knee Length\n\n"
+                f"{self.hem_length_cm} cm self hem\n\n"
+                f"Customized instructions specifically designed for "
+                f"machine gauge of {self.gauge_string}.\n\n")
 
 
 class Pencil_Skirt(Garment):
-    def __init__(self, body_data, person, gauge=(10, 10)):
+    required_places = ("belowKnees", "fullThighs", "seatDepth", "lowHip", "highHip", "waist", "frontNeck", "backNeck")
+
+    def __init__(self, body_data, person, gauge=(10, 10), needle_bed=None):
         '''
-        :param body_data: imported from measurement data file
+        :param body_data: imported from measurement data file, or Measurements, it is not changed
         :param person: imported from measurement data file
         :param gauge: type tuple stitches per 10 cm, rows per 10 cm
+        :param needle_bed: NeedleBed of the knitting machine, defaults to Garment.needle_bed
         '''
+        if needle_bed is not None:
+            self.needle_bed = needle_bed
         self.style_name = "Pencil Skirt"
         self.person = person
-        self.body_data = body_data
-        self.body_shape = Body(body_data, person)
+        self.body_data = Measurements(body_data)
+        self.body_shape = Body(self.body_data, person)
         self.gauge_string = f'gauge {gauge[0]} {gauge[1]}'
         self.title = f'{self.style_name} for {self.person} at {self.gauge_string}'
         self.straighten_waist(5)  # cm
@@ -948,17 +2148,52 @@ class Pencil_Skirt(Garment):
                      "number_to_make": int(1),
                      "gauge": gauge}  # uses default but there is a method to change this
         }
-        self.cover_text = (f"Custom Fitted Pencil Skirt\n\n"
-                           f"Close fitting waist with  {front_places_with_ease_percent['waist1']}% "
-                           f"ease at the front waist "
-                           f"and {back_places_with_ease_percent['waist1']}% "
-                           f"ease at the back waist\n\n"
-                           f"Fold over waist hem allows for optional (recommended) elastic waistband\n\n"
-                           f"Custom Fitted Hip Curve with {front_places_with_ease_percent['highHip']} "
-                           f"% ease at front hip and {back_places_with_ease_percent['highHip']} "
-                           f"% ease at back hip\n\n"
-                           f"Below Knee Length\n\n"
-                           f"{self.hem_length_cm} cm self hem\n\n"
-                           f"Customized instructions specifically designed for "
-                           f"machine gauge of {self.gauge_string}.\n\n")
-        self.make_all()
+
+    @property
+    def cover_text(self):
+        # made from the current ease and hem length, so it is up to date after set_ease_for_piece or set_hem_length
+        front_places_with_ease_percent = self.required_pattern_pieces["Front"]["places_with_ease"]
+        back_places_with_ease_percent = self.required_pattern_pieces["Back"]["places_with_ease"]
+        return (f"Custom Fitted Pencil Skirt\n\n"
+                f"Close fitting waist with  {front_places_with_ease_percent['waist1']}% "
+                f"ease at the front waist "
+                f"and {back_places_with_ease_percent['waist1']}% "
+                f"ease at the back waist\n\n"
+                f"Fold over waist hem allows for optional (recommended) elastic waistband\n\n"
+                f"Custom Fitted Hip Curve with {front_places_with_ease_percent['highHip']} "
+                f"% ease at front hip and {back_places_with_ease_percent['highHip']} "
+                f"% ease at back hip\n\n"
+                f"Below Knee Length\n\n"
+                f"{self.hem_length_cm} cm self hem\n\n"
+                f"Customized instructions specifically designed for "
+                f"machine gauge of {self.gauge_string}.\n\n")
+
+
+# the garments main can make, by the name given on the command line
+garment_classes = {"Tshirt": Tshirt, "Dress": Dress, "Pencil_Skirt": Pencil_Skirt}
+
+
+def main():
+    # prints the yarn estimate and stitch counts of a garment, without drawing or writing anything
+    parser = argparse.ArgumentParser(description="Print the yarn estimate and stitch counts of a garment.")
+    parser.add_argument("measurements", help="measurement module with person and body_data, e.g. measurements_Debra_Martin")
+    parser.add_argument("garment", nargs="?", default="Tshirt", choices=tuple(garment_classes))
+    parser.add_argument("--gauge", nargs=2, type=int, default=[10, 10], metavar=("STITCHES", "ROWS"),
+                        help="stitches and rows per 10 cm")
+    args = parser.parse_args()
+    measurements = importlib.import_module(args.measurements.removesuffix(".py"))
+    gauge = tuple(args.gauge)
+    garment = garment_classes[args.garment](measurements.body_data, measurements.person, gauge=gauge)
+    counts = garment.gauge_sweep([gauge])[gauge]
+    if counts["error"]:
+        print(counts["error"])
+        return 1
+    print(f"{garment.title}: {counts['yarn_meters']} meters of yarn")
+    for pattern_piece_name in garment.required_pattern_pieces:
+        print(f"{pattern_piece_name} x {garment.required_pattern_pieces[pattern_piece_name]['number_to_make']}: "
+              f"{counts['stitches'][pattern_piece_name]} stitches in {counts['rows'][pattern_piece_name]} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
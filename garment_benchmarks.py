@@ -0,0 +1,252 @@
+"""
+Benchmarks for custom_knit_garments.
+
+Times every stage of make_all for each garment, gauge and synthetic body, and writes the results as json so two
+versions can be compared.  Every case runs in a fresh process, one at a time, so the numbers do not depend on
+what ran before and the peak memory is that of the one case.  The synthetic bodies are made from fixed seeds and
+nothing is read from the network, so the same version gives the same patterns, file sizes and, within the noise
+of the machine, the same times.
+
+Run it from the repository folder, like the per-client scripts, because the style sheets and font are found
+relative to it:
+
+    python garment_benchmarks.py --garment Tshirt Dress --gauge 10x10 32x38 --output new.json --compare old.json
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+
+import custom_knit_garments
+
+# the proportions of a medium body, place: (meas, height, circumferential, region).  Heights are from the waist.
+body_template = {
+    "floor": (80, -105, True, "legs"),
+    "belowCalves": (80, -88, True, "legs"),
+    "aboveCalves": (83, -73, True, "legs"),
+    "belowKnees": (83, -67, True, "legs"),
+    "aboveKnees": (93, -57, True, "legs"),
+    "midThighs": (100, -44, True, "legs"),
+    "fullThighs": (111, -40, True, "legs"),
+    "seatDepth": (112, -27, True, "hips"),
+    "lowHip": (110, -17, True, "hips"),
+    "highHip": (98, -12, True, "hips"),
+    "waist": (77, 0, True, "waist"),
+    "underBust": (84, 10, True, "bust"),
+    "fullBust": (97, 19, True, "bust"),
+    "highBust": (90, 29, True, "bust"),
+    "underArm0": (45, 29, False, "bust"),
+    "underArm1": (40, 29, False, "bust"),
+    "underArm2": (34, 31, False, "bust"),
+    "underArm3": (32, 43, False, "bust"),
+    "outerShoulder": (96, 38, True, "shoulders"),
+    "shoulderNeck": (38, 47, True, "neck"),
+    "frontNeck": (38, 36, True, "neck"),
+    "backNeck": (38, 44, True, "neck"),
+}
+# name: (girth, stature, seed).  girth scales the measurements, stature the heights.
+bodies = {
+    "small": (0.85, 0.95, 1),
+    "medium": (1.0, 1.0, 2),
+    "large": (1.25, 1.02, 3),
+}
+gauges = ("10x10", "20x28", "32x38", "40x50")
+garments = ("Tshirt", "Dress", "Pencil_Skirt")
+# wide enough for the large body at 40x50
+needle_bed = custom_knit_garments.NeedleBed(200, 200)
+
+BenchmarkCase = namedtuple("BenchmarkCase", ["garment", "gauge", "body", "stitch_map_format", "output_folder"])
+
+
+def synthetic_body_data(girth=1.0, stature=1.0, seed=0):
+    """
+    A body_data dict like the ones in the measurement data files, for a made up body.
+    Each region (legs, hips, waist, bust, shoulders) is scaled by girth and then by its own random factor of up to
+    5% either way, so bodies of the same size still differ in proportion.  The neck changes a third as much.
+    :param girth: 1 for a medium body
+    :param stature: 1 for a medium height
+    :param seed: the same seed always gives the same body
+    """
+    rng = random.Random(seed)
+    regions = sorted({region for _, _, _, region in body_template.values()})
+    scale = {region: girth * rng.uniform(0.95, 1.05) for region in regions}
+    scale["neck"] = 1 + (girth - 1) / 3
+    return {place: {"meas": round(meas * scale[region], 1),
+                    "height": round(height * stature, 1),
+                    "circumferential": circumferential}
+            for place, (meas, height, circumferential, region) in body_template.items()}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10  # bytes on macOS, kB elsewhere
+
+
+def file_size(file_name):
+    return os.path.getsize(file_name) if os.path.exists(file_name) else 0
+
+
+def run_case(case):
+    """
+    Runs one case and times each stage.  Meant to run in a fresh process, see run_benchmarks.
+    :return: dict of the stage times in seconds, peak memory, output file sizes, yarn estimate and rows per piece
+    """
+    stages = {}
+
+    def timed(stage, make):
+        start = time.perf_counter()
+        make()
+        stages[stage] = time.perf_counter() - start
+
+    def load_outputs():
+        import matplotlib.figure  # noqa: F401
+        import garment_pdf  # noqa: F401
+
+    timed("imports", load_outputs)
+    girth, stature, seed = bodies[case.body]
+    garment_class = getattr(custom_knit_garments, case.garment)
+    custom_knit_garments.Garment.results_folder = os.path.join(case.output_folder, "results")
+    custom_knit_garments.Garment.patterns_folder = os.path.join(case.output_folder, "patterns")
+    custom_knit_garments.Garment.stitch_map_format = case.stitch_map_format
+    gauge = tuple(int(count) for count in case.gauge.split("x"))
+    garment = None
+
+    def build():
+        nonlocal garment
+        garment = garment_class(synthetic_body_data(girth, stature, seed), f"Synthetic {case.body}", gauge=gauge,
+                                needle_bed=needle_bed)
+
+    timed("measurements", build)
+    pieces = list(garment.required_pattern_pieces)
+    timed("pattern_shapes", lambda: [garment.make_pattern_shape(piece) for piece in pieces])
+    timed("needle_charts", lambda: [garment.create_needle_chart(piece) for piece in pieces])
+    timed("yarn", lambda: garment.total_yarn_meters)
+    timed("plots", garment.make_and_save_plot_svg_files)
+    timed("stitch_maps", garment.make_and_save_stitch_maps)
+    timed("instructions", garment.write_instructions)
+    timed("pdf", lambda: garment.create_pdf(garment.pdf_file_name()))
+    return {
+        "stages": stages,
+        "total_seconds": sum(stages.values()),
+        "peak_rss_mb": peak_rss_mb(),
+        "file_bytes": {
+            "plots": sum(file_size(garment.plot_file_name(plot_number)) for plot_number in range(1, 5)),
+            "stitch_maps": sum(file_size(garment.stitch_map_file_name(piece)) for piece in pieces),
+            "instructions": sum(file_size(garment.instructions_file_name(piece)) for piece in pieces),
+            "pdf": file_size(garment.pdf_file_name()),
+        },
+        "yarn_meters": garment.total_yarn_meters,
+        "rows": {piece: len(garment.create_needle_chart(piece)) for piece in pieces},
+    }
+
+
+def run_benchmarks(cases, repeat=1):
+    """
+    Runs every case repeat times, each run in a new process, one run at a time.
+    Yields (case, result) where result holds the fastest time of each stage over the runs, the largest peak
+    memory and the total time of every run, or {"error": ...} for a case that failed, and goes on to the next case.
+    """
+    spawn = multiprocessing.get_context("spawn")  # a clean interpreter for every run
+    for case in cases:
+        # a pool for each case, so a run that kills its process does not stop the cases after it
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=spawn, max_tasks_per_child=1) as pool:
+            try:
+                runs = [pool.submit(run_case, case).result() for _ in range(repeat)]
+            except Exception as error:
+                yield case, {"error": f"{type(error).__name__}: {error}"}
+                continue
+            result = dict(runs[0])
+            result["stages"] = {stage: min(run["stages"][stage] for run in runs) for stage in runs[0]["stages"]}
+            result["total_seconds"] = min(run["total_seconds"] for run in runs)
+            result["median_total_seconds"] = statistics.median(run["total_seconds"] for run in runs)
+            result["peak_rss_mb"] = max(run["peak_rss_mb"] for run in runs)
+            result["run_total_seconds"] = [run["total_seconds"] for run in runs]
+            yield case, result
+
+
+def environment():
+    import fpdf
+    import matplotlib
+    import numpy
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "matplotlib": matplotlib.__version__,
+        "fpdf": fpdf.__version__,
+        "custom_knit_garments": custom_knit_garments.module_digest()[:12],
+    }
+
+
+def case_key(result):
+    return f"{result['garment']} {result['gauge']} {result['body']}"
+
+
+def compare(old, new):
+    # prints the total time of each case in both results and how the new one changed
+    old_results = {case_key(result): result for result in old["results"]}
+    print(f"{'case':<30} {'old s':>8} {'new s':>8} {'change':>8}   slowest stage")
+    for result in new["results"]:
+        key = case_key(result)
+        if key not in old_results or "error" in result or "error" in old_results[key]:
+            continue
+        old_seconds, new_seconds = old_results[key]["total_seconds"], result["total_seconds"]
+        slowest = max(result["stages"], key=result["stages"].get)
+        print(f"{key:<30} {old_seconds:8.2f} {new_seconds:8.2f} {100 * (new_seconds / old_seconds - 1):+7.1f}%   "
+              f"{slowest} {old_results[key]['stages'][slowest]:.2f}s -> {result['stages'][slowest]:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every stage of making garment patterns.")
+    parser.add_argument("--garment", nargs="+", default=list(garments), choices=garments)
+    parser.add_argument("--gauge", nargs="+", default=list(gauges), metavar="STITCHESxROWS",
+                        help="stitches and rows per 10 cm, e.g. 32x38")
+    parser.add_argument("--body", nargs="+", default=list(bodies), choices=list(bodies))
+    parser.add_argument("--repeat", type=int, default=1, help="runs of each case, the fastest is reported")
+    # png by default, fpdf cannot place the svg stitch maps of the finer gauges, see Garment.stitch_map_format
+    parser.add_argument("--stitch-map-format", default="png", choices=("svg", "png"))
+    parser.add_argument("--output", default="benchmark_results.json", help="json file to write the results to")
+    parser.add_argument("--keep-outputs", default=None, metavar="FOLDER",
+                        help="keep the plots, instructions and pdfs here, they are deleted by default")
+    parser.add_argument("--compare", default=None, metavar="JSON", help="earlier results to compare with")
+    args = parser.parse_args()
+
+    output_folder = args.keep_outputs or tempfile.mkdtemp(prefix="garment_benchmarks_")
+    cases = [BenchmarkCase(garment, gauge, body, args.stitch_map_format, output_folder)
+             for garment in args.garment for gauge in args.gauge for body in args.body]
+    results = {"environment": environment(), "repeat": args.repeat, "results": []}
+    try:
+        for case, result in run_benchmarks(cases, args.repeat):
+            results["results"].append({"garment": case.garment, "gauge": case.gauge, "body": case.body,
+                                       "stitch_map_format": case.stitch_map_format, **result})
+            if "error" in result:
+                print(f"{case.garment} {case.gauge} {case.body}: failed, {result['error']}")
+                continue
+            print(f"{case.garment} {case.gauge} {case.body}: {result['total_seconds']:.2f} s, "
+                  f"{result['peak_rss_mb']:.0f} MB, pdf {result['file_bytes']['pdf'] / 1024:.0f} kB")
+    finally:
+        if args.keep_outputs is None:
+            shutil.rmtree(output_folder, ignore_errors=True)
+        with open(args.output, "w") as results_file:
+            json.dump(results, results_file, indent=1)
+    if args.compare:
+        with open(args.compare) as old_file:
+            compare(json.load(old_file), results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
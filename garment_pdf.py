@@ -0,0 +1,211 @@
+"""
+The pattern pdf.  Kept apart from custom_knit_garments so that fpdf is only imported when a pdf is made.
+PDF lays out the pages of a pattern, PDFResources holds what every pdf made in a process can share.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import fpdf
+import fpdf.image_datastructures
+import fpdf.svg
+
+
+class PDFResources:
+    """
+    What every pdf made in a process can share.  fpdf converts an svg image to drawing paths each time it is
+    placed, which takes longer than laying out everything else in a pattern.  svg images that are placed again
+    and again, like the cover plots, are converted once here, keyed by a hash of the svg, and the converted paths
+    are drawn into every pdf that uses the same svg.  A converted svg takes 10 to 20 times the memory of the svg
+    itself, so the least recently used conversions are dropped once the svgs kept add up to more than
+    max_svg_bytes, and the stitch maps, which are different for every order, are converted each time and not kept.
+    Fonts are added to each pdf from fonts, {family: font file}.  fpdf subsets a font in place when it writes the
+    pdf, so a parsed font cannot be shared between documents.
+    """
+    fonts = {"Brazilia": "Brazilia.ttf"}
+
+    def __init__(self, max_svg_bytes=2 * 2 ** 20):
+        self.max_svg_bytes = max_svg_bytes
+        # svg hash: (svg size, (fpdf.svg.SVGObject, its VectorImageInfo)), least recently used first
+        self.svgs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add_fonts(self, pdf):
+        for family, font_file in self.fonts.items():
+            pdf.add_font(family=family, style="", fname=font_file)
+
+    def svg(self, svg_data, pdf):
+        # the converted svg and its size, kept by a hash of svg_data
+        key = hashlib.sha256(svg_data).digest()
+        if key in self.svgs:
+            self.svgs.move_to_end(key)
+            return self.svgs[key][1]
+        svg = fpdf.svg.SVGObject(svg_data, svg_limits=pdf.svg_limits)
+        # the size fpdf.image_parsing.get_svg_info gives an svg, from its viewBox, then its width and height
+        width, height = svg.viewbox[2:] if svg.viewbox else (0.0, 0.0)
+        info = fpdf.image_datastructures.VectorImageInfo(data=svg, w=svg.width or width, h=svg.height or height)
+        self.svgs[key] = (len(svg_data), (svg, info))
+        svg_bytes = sum(size for size, _ in self.svgs.values())
+        while svg_bytes > self.max_svg_bytes and len(self.svgs) > 1:
+            svg_bytes -= self.svgs.popitem(last=False)[1][0]
+        return svg, info
+
+    def draw_svg(self, pdf, file_name, x, y, w, keep=True):
+        """
+        Draws an svg file into pdf like pdf.image(name=file_name, x=x, y=y, w=w) does.  A kept svg is converted
+        once and then placed by fpdf's own code for a converted svg, FPDF._vector_image, so its size, gradients
+        and errors, such as for an svg with no width, height or viewBox, are the same as pdf.image gives.
+        Kept svgs are converted without the image cache of any one pdf, so svgs with raster images in them must
+        not be kept.
+        :param keep: keep the converted svg for the next pdf, False for svgs that are only placed once
+        """
+        if not keep:
+            pdf.image(name=file_name, x=x, y=y, w=w)
+            return
+        with open(file_name, "rb") as svg_file:
+            svg_data = svg_file.read()
+        with self.lock:  # placing an SVGObject changes its transform
+            svg, info = self.svg(svg_data, pdf)
+            pdf._vector_image(file_name, svg, info, x=x, y=y, w=w)
+
+
+class PDF(fpdf.FPDF):
+    # page width = 215.9mm
+    # column 1 span = 58.6mm
+    # column 2 span = 123mm
+    # col 1 x pos = 10
+    # col 2 x pos = 78.6
+
+    def __init__(self, *args, resources=None, **kwargs):
+        """
+        :param resources: PDFResources shared with other pdfs, a new one by default
+        """
+        super().__init__(*args, **kwargs)
+        self.resources = resources or PDFResources()
+        self.resources.add_fonts(self)
+
+    def place_image(self, image, x, y, w, keep=True):
+        if image.endswith(".svg"):
+            self.resources.draw_svg(self, image, x, y, w, keep)
+        else:
+            self.image(x=x, y=y, name=image, w=w)
+
+    def header(self):
+        self.set_font(family="Helvetica", style="", size=12)
+        width = self.get_string_width(self.title) + 6
+        # self.image("./images/stitches_logo.png", x=((210 - width) / 2) - 5, y=15, w=10, h=10, type='', link='')
+        self.set_x((216 - width) / 2)
+        self.set_draw_color(255, 204, 239)
+        self.set_fill_color(255, 230, 247)
+        self.set_text_color(0, 0, 0)
+        self.set_line_width(.25)
+        if self.page_no() > 1:
+            self.cell(
+                width,
+                10,
+                self.title,
+                border=0,
+                new_x="LMARGIN",
+                new_y="NEXT",
+                align="C",
+                fill=False,
+            )
+            self.cell(w=80, h=10, new_x="LMARGIN", new_y="NEXT")
+
+    def print_cover_page(self, image, cover_text):
+        self.set_font(family="Brazilia", style="", size=36)
+        width = self.get_string_width(self.title.upper()) + 6
+        self.set_xy((216 - width) / 2, 20)
+        self.set_text_color(102, 0, 70)
+        self.cell(
+            w=width,
+            h=10,
+            text=self.title.upper(),
+            border=0,
+            new_x="LMARGIN",
+            new_y="NEXT",
+            align="C",
+            fill=False
+        )
+        self.place_image(image, x=78, y=35, w=123)
+        self.set_font(family="Brazilia", style="", size=12)
+        self.set_y(45)
+        self.multi_cell(w=59, h=5, text=cover_text, border=0, new_x="LMARGIN", new_y="NEXT", align="L", fill=False)
+
+    def print_stitch_table_page(self, td, width=160):
+        """
+        Prints the stitch table over as many pages as it needs, with the column names at the top of each page.
+        Every cell is one line of text, so the column widths and the number of rows on a page are measured once,
+        up front, and each row is printed as plain cells rather than laid out by fpdf's table.
+        :param td: list of table rows of cell text, the column names first, see create_data_for_stitch_table
+        :param width: width of the table in mm, centred on the page
+        """
+        top = 25
+        column_names, rows = td[0], td[1:]
+        self.set_font(family="Times", style="", size=10)
+        line_height = self.font_size * 1.5
+        # each column as wide as its widest cell, then all of them stretched to fill width
+        widths = [max(self.get_string_width(str(text)) for text in column) + 2 * self.c_margin
+                  for column in zip(*td)]
+        widths = [column_width * width / sum(widths) for column_width in widths]
+        left = (self.w - width) / 2
+        rows_per_page = max(int((self.page_break_trigger - top) / line_height) - 1, 1)
+        for first in range(0, max(len(rows), 1), rows_per_page):
+            self.add_page()  # the header changes the colours
+            self.set_draw_color(0, 0, 0)
+            self.set_line_width(.2)
+            self.set_fill_color(200, 200, 200)
+            self.set_text_color(0, 0, 0)
+            self.set_xy(left, top)
+            self.set_font(family="Times", style="B", size=10)
+            for column_width, text in zip(widths, column_names):
+                self.cell(w=column_width, h=line_height, text=text, align="C")
+            self.line(left, top + line_height, left + width, top + line_height)
+            self.set_font(family="Times", style="", size=10)
+            for index, data_row in enumerate(rows[first:first + rows_per_page]):
+                self.set_xy(left, top + (index + 1) * line_height)
+                for column_width, text in zip(widths, data_row):
+                    self.cell(w=column_width, h=line_height, text=str(text), align="C", fill=index % 2 == 1)
+
+    def print_stitch_map(self, image):
+        self.add_page()
+        self.place_image(image, x=10, y=25, w=196, keep=False)  # every order has its own stitch maps
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font(family="helvetica", style="I", size=8)
+        if self.page_no() != 1:
+            self.cell(w=0, h=10, text=f"Page {self.page_no()}/{{nb}}", align="C")
+
+    def chapter_title(self, num, label):
+        self.set_font(family="Brazilia", style="", size=24)
+        self.set_text_color(0, 0, 0)
+        self.set_fill_color(255, 230, 247)
+        # self.set_y(-130)
+        self.cell(
+            w=0,
+            h=10,
+            text=f"{label}: Knit {num}",
+            new_x="LMARGIN",
+            new_y="NEXT",
+            border="L",
+            fill=True,
+        )
+        self.cell(w=0, h=4)
+
+    def chapter_body(self, txt):
+        with self.text_columns(
+                ncols=2, gutter=5, text_align="J", line_height=1.5
+        ) as cols:
+            self.set_font(family="Brazilia", size=12)
+            self.set_text_color(0, 0, 0)
+            cols.write(txt)
+            cols.ln()
+            # Final mention in italics:
+            # self.set_font(style="I")
+            # cols.write(f"end {pattern_piece_name}")
+
+    def print_chapter(self, num, title, text):
+        self.add_page()
+        self.chapter_title(num, title)
+        self.chapter_body(text)
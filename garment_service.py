@@ -0,0 +1,316 @@
+"""
+A long running pattern service for custom_knit_garments, on the standard library http.server.
+
+A one-off script pays for starting python, importing matplotlib and fpdf, reading the style sheets and setting up
+the pdf images before it makes anything.  The service pays for them once, when it starts, and keeps them warm,
+along with the plot figures of recent bodies and the pdf images already converted, for every job after that.
+Jobs wait in a bounded queue for a pool of worker threads.  When the queue is full new jobs are turned away
+with 503 rather than piling up.  Finished jobs are kept, results and pdf, until max_finished newer jobs
+have finished.
+
+Run it from the repository folder, like the per-client scripts, because the style sheets and font are found
+relative to it:
+
+    python garment_service.py --port 8000 --workers 2 --queue 16
+
+    POST /jobs          {"person": "Debra Martin", "body_data": {...}, "garment": "Tshirt", "gauge": [32, 38]}
+                        202 and the job, or 400 for a bad job, or 503 when the queue is full
+    GET  /jobs/ID       the job: its status (queued, running, done or failed), the stage it is on and the
+                        stages done, then the yarn estimate, needle charts and seconds per stage, or the error
+    GET  /jobs/ID/pdf   the pattern pdf, once the job is done
+    GET  /health        number of jobs queued, running and finished
+
+For example, with curl:
+
+    curl -d @job.json localhost:8000/jobs
+    curl localhost:8000/jobs/1
+    curl -o pattern.pdf localhost:8000/jobs/1/pdf
+"""
+import argparse
+import contextlib
+import http.server
+import itertools
+import json
+import queue
+import tempfile
+import threading
+import traceback
+import urllib.parse
+from collections import OrderedDict
+
+import custom_knit_garments
+import measurement_files
+
+garments = ("Tshirt", "Dress", "Pencil_Skirt")
+max_request_bytes = 2 ** 20
+
+
+class Job:
+    """
+    One garment order and what has happened to it so far.  The worker running the job is the only thread that
+    changes it.
+    """
+
+    def __init__(self, job_id, request):
+        self.id = job_id
+        self.request = request
+        self.status = "queued"
+        self.stage = None  # the innermost stage running, None between stages
+        self.stages_done = []
+        self.result = None
+        self.pdf = None
+        self.error = None
+
+    def as_dict(self):
+        return {"id": self.id, "status": self.status, "stage": self.stage, "stages_done": list(self.stages_done),
+                "result": self.result, "error": self.error}
+
+
+class JobProgress(custom_knit_garments.StageProfiler):
+    # a StageProfiler that also keeps the job up to date with the stage it is on
+
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+        self.labels = threading.local()  # the stages open on each thread, innermost last
+
+    @contextlib.contextmanager
+    def stage(self, name, pattern_piece_name=None, garment=None):
+        label = name if pattern_piece_name is None else f"{name} {pattern_piece_name}"
+        labels = self.labels.__dict__.setdefault("stack", [])
+        labels.append(label)
+        self.job.stage = label
+        try:
+            with super().stage(name, pattern_piece_name, garment):
+                yield
+            self.job.stages_done.append(label)
+        finally:
+            # back to the stage this one was made in, which is still running
+            labels.pop()
+            self.job.stage = labels[-1] if labels else None
+
+
+def check_request(request):
+    """
+    Checks a job request has everything a garment needs, the body_data places included, before it is queued.
+    :raises ValueError: saying what is wrong with it
+    """
+    if not isinstance(request, dict):
+        raise ValueError("A job must be a json object.")
+    missing = [key for key in ("person", "body_data", "garment", "gauge") if key not in request]
+    if missing:
+        raise ValueError(f"A job needs {', '.join(missing)}.")
+    if request["garment"] not in garments:
+        raise ValueError(f"garment must be one of {', '.join(garments)}.")
+    if not isinstance(request["body_data"], dict):
+        raise ValueError("body_data must be an object of place: {\"meas\", \"height\", \"circumferential\"}.")
+    gauge = request["gauge"]
+    if not (isinstance(gauge, list) and len(gauge) == 2 and
+            all(isinstance(count, int) and not isinstance(count, bool) and count > 0 for count in gauge)):
+        raise ValueError("gauge must be [stitches per 10 cm, rows per 10 cm].")
+    garment_class = getattr(custom_knit_garments, request["garment"])
+    measurement_files.check_body_data(request["person"], request["body_data"], garment_class.required_places)
+
+
+def warm_up():
+    # what the first job would otherwise pay for: the imports, the style sheets and the pdf images
+    import matplotlib.figure  # noqa: F401
+    import garment_pdf
+    for style_file in (custom_knit_garments.PlotRenderer.garment_style, custom_knit_garments.PlotRenderer.cover_style,
+                       "./images/stitchchart.mplstyle"):
+        custom_knit_garments.style_params(style_file)
+    if custom_knit_garments.Garment.pdf_resources is None:
+        custom_knit_garments.Garment.pdf_resources = garment_pdf.PDFResources()
+
+
+class PatternService:
+    """
+    The job queue and the worker threads that run the jobs, without the http part, so it can also be used
+    directly:
+
+        service = PatternService(workers=2)
+        job = service.submit({"person": person, "body_data": body_data, "garment": "Tshirt", "gauge": [32, 38]})
+        ...
+        service.close()
+    """
+
+    def __init__(self, workers=1, max_queued=16, max_finished=64):
+        """
+        :param workers: number of worker threads
+        :param max_queued: most jobs waiting at once, submit raises queue.Full past it
+        :param max_finished: number of finished jobs kept, with their pdfs, the oldest are forgotten first
+        """
+        warm_up()
+        self.max_finished = max_finished
+        self.queue = queue.Queue(max_queued)
+        self.jobs = OrderedDict()  # id: Job, in the order they were submitted
+        self.finished = OrderedDict()  # id: None, in the order they finished
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.workers = [threading.Thread(target=self.work, name=f"garment worker {number}", daemon=True)
+                        for number in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, request):
+        """
+        Queues a job.
+        :param request: dict with person, body_data, garment (Tshirt, Dress or Pencil_Skirt) and gauge
+        :return: the Job
+        :raises ValueError: if the request is not a job, see check_request
+        :raises queue.Full: if max_queued jobs are already waiting
+        """
+        check_request(request)
+        with self.lock:
+            job = Job(str(next(self.ids)), request)
+            self.queue.put_nowait(job)
+            self.jobs[job.id] = job
+        return job
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def counts(self):
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            job.status = "running"
+            try:
+                job.result, job.pdf = self.run(job)
+                job.status = "done"
+            except Exception:
+                job.error = traceback.format_exc()
+                job.status = "failed"
+            with self.lock:
+                self.finished[job.id] = None
+                while len(self.finished) > self.max_finished:
+                    self.jobs.pop(self.finished.popitem(last=False)[0], None)
+
+    @staticmethod
+    def run(job):
+        """
+        Makes the garment of a job.  The plots and stitch maps the pdf is made from are saved in a temporary
+        folder, removed once the pdf is made.
+        :return: (result dict, pdf bytes)
+        """
+        request = job.request
+        garment_class = getattr(custom_knit_garments, request["garment"])
+        garment = garment_class(request["body_data"], request["person"], gauge=tuple(request["gauge"]))
+        garment.profiler = JobProgress(job)
+        garment.instructions_files = False
+        with tempfile.TemporaryDirectory(prefix="garment_service_") as folder:
+            garment.results_folder = folder
+            garment.make_outputs()
+            pdf = garment.create_pdf()
+        result = {
+            "title": garment.title,
+            "total_yarn_meters": garment.total_yarn_meters,
+            "needle_charts": {pattern_piece_name: garment.create_needle_chart(pattern_piece_name).as_dict()
+                              for pattern_piece_name in garment.required_pattern_pieces},
+            "stage_seconds": {stage: total["seconds"] for stage, total in garment.profiler.totals().items()},
+        }
+        return result, pdf
+
+    def close(self):
+        # lets the jobs already queued finish, then stops the workers
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+
+class ServiceHandler(http.server.BaseHTTPRequestHandler):
+    # the PatternService is server.service, see serve
+
+    def send_body(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for header, value in headers:
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data, headers=()):
+        self.send_body(status, json.dumps(data).encode(), "application/json", headers)
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            return self.send_json(404, {"error": f"No {self.path}, post jobs to /jobs."})
+        length = int(self.headers.get("Content-Length", 0))
+        if length > max_request_bytes:
+            return self.send_json(413, {"error": f"A job must be at most {max_request_bytes} bytes."})
+        try:
+            job = self.server.service.submit(json.loads(self.rfile.read(length)))
+        except ValueError as error:
+            return self.send_json(400, {"error": str(error)})
+        except queue.Full:
+            return self.send_json(503, {"error": "The job queue is full, try again later."}, [("Retry-After", "5")])
+        self.send_json(202, job.as_dict(), [("Location", f"/jobs/{job.id}")])
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if parts == ["health"]:
+            return self.send_json(200, self.server.service.counts())
+        job = self.server.service.job(parts[1]) if parts[0] == "jobs" and len(parts) in (2, 3) else None
+        if job is None:
+            return self.send_json(404, {"error": f"No {self.path}."})
+        if len(parts) == 2:
+            return self.send_json(200, job.as_dict())
+        if parts[2] != "pdf":
+            return self.send_json(404, {"error": f"No {self.path}."})
+        if job.status != "done":
+            return self.send_json(409, {"error": f"Job {job.id} is {job.status}, it has no pdf."})
+        file_name = urllib.parse.quote(f"{job.result['title']}.pdf")  # headers are latin-1, names may not be
+        self.send_body(200, job.pdf, "application/pdf",
+                       [("Content-Disposition", f"attachment; filename*=UTF-8''{file_name}")])
+
+
+def serve(service, host="127.0.0.1", port=8000):
+    """
+    Makes the http server for service, call serve_forever on it to start serving.
+    """
+    server = http.server.ThreadingHTTPServer((host, port), ServiceHandler)
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve garment patterns over http, with everything kept warm.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="number of jobs made at once")
+    parser.add_argument("--queue", type=int, default=16, help="most jobs waiting, more are turned away")
+    parser.add_argument("--keep", type=int, default=64, help="number of finished jobs kept with their pdfs")
+    parser.add_argument("--output-pool", default=None, choices=("thread", "process"),
+                        help="draw the plots and stitch maps of each job on a pool, see Garment.output_pool")
+    parser.add_argument("--cache", default=None, metavar="DIRECTORY",
+                        help="reuse plots, instructions and pdfs already made from the same inputs")
+    args = parser.parse_args()
+
+    custom_knit_garments.Garment.output_pool = args.output_pool
+    if args.cache is not None:
+        custom_knit_garments.Garment.artifact_cache = custom_knit_garments.ArtifactCache(args.cache)
+    service = PatternService(workers=args.workers, max_queued=args.queue, max_finished=args.keep)
+    server = serve(service, args.host, args.port)
+    print(f"Serving garment patterns on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        custom_knit_garments.Garment.close_output_pools()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
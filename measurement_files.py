@@ -0,0 +1,165 @@
+"""
+Reads many clients' measurements from one file, instead of a measurements module for each client.
+
+Two kinds of file are read:
+
+csv (or tsv), one row per place, with a header row.  The rows of each client must come one after another:
+
+    person,place,meas,height,circumferential
+    Debra Martin,floor,80,-105,true
+    Debra Martin,belowCalves,80,-88,true
+    ...
+
+json lines, one client per line, laid out like a measurements module:
+
+    {"person": "Debra Martin", "body_data": {"floor": {"meas": 80, "height": -105, "circumferential": true}, ...}}
+
+read_measurements reads the file one client at a time and yields a MeasurementRecord for each client, so the
+memory it uses does not grow with the size of the file.  Each client is checked for the places the garments
+need and for sensible numbers before it is yielded.  Nothing in the file is run as code.
+
+Example, making a Tshirt for every client in a file:
+
+    from batch_garments import GarmentJob, run_batch
+    from measurement_files import read_measurements
+
+    jobs = (GarmentJob(record.person, record.body_data, "Tshirt", (32, 38))
+            for record in read_measurements("clients.csv", ["Tshirt"]))
+    for job_result in run_batch(jobs):
+        print(job_result.job.person, job_result.result or job_result.error)
+
+batch_garments.py also takes these files in place of measurement modules.
+"""
+import csv
+import itertools
+import json
+import math
+from collections import namedtuple
+
+import custom_knit_garments
+
+MeasurementRecord = namedtuple("MeasurementRecord", ["person", "body_data", "line"])  # line the client starts on
+csv_columns = ("person", "place", "meas", "height", "circumferential")
+true_words = {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}
+
+
+def required_places(garment_classes):
+    """
+    :param garment_classes: Garment subclasses, or their names in custom_knit_garments
+    :return: set of the body_data places needed to make all of them
+    """
+    places = set()
+    for garment_class in garment_classes:
+        if isinstance(garment_class, str):
+            garment_class = getattr(custom_knit_garments, garment_class)
+        places.update(garment_class.required_places)
+    return places
+
+
+def check_body_data(person, body_data, places):
+    """
+    Checks body_data has every place in places and that each place has a positive meas, a height and a
+    true or false circumferential.
+    :raises ValueError: saying what is wrong and for whom
+    """
+    if not person:
+        raise ValueError("A client has no person name.")
+    missing = sorted(set(places).difference(body_data))
+    if missing:
+        raise ValueError(f"{person} has no {', '.join(missing)} measurements.")
+    for place, values in body_data.items():
+        if not isinstance(values, dict) or set(values) != {"meas", "height", "circumferential"}:
+            raise ValueError(f"{person} {place} must have meas, height and circumferential, and nothing else.")
+        for key in ("meas", "height"):
+            if isinstance(values[key], bool) or not isinstance(values[key], (int, float)) or \
+                    not math.isfinite(values[key]):
+                raise ValueError(f"{person} {place} {key} must be a number of cm, not {values[key]!r}.")
+        if values["meas"] <= 0:
+            raise ValueError(f"{person} {place} meas must be more than 0 cm, not {values['meas']!r}.")
+        if not isinstance(values["circumferential"], bool):
+            raise ValueError(f"{person} {place} circumferential must be true or false, "
+                             f"not {values['circumferential']!r}.")
+
+
+def number(text):
+    # the float in text, or text itself for check_body_data to report
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def csv_clients(rows):
+    # yields (line, person, body_data, problem) for each client, from csv rows in the order they are read.
+    # problem is None, or what is wrong with the client's rows.
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [column.strip() for column in header]
+    if sorted(header) != sorted(csv_columns):
+        raise ValueError(f"The csv columns must be {', '.join(csv_columns)}, not {', '.join(header)}.")
+    # short rows are filled out with blanks, for check_body_data to report
+    rows = ((line, dict(itertools.zip_longest(header, (value.strip() for value in row), fillvalue="")))
+            for line, row in enumerate(rows, 2) if row)
+    for person, client_rows in itertools.groupby(rows, key=lambda numbered_row: numbered_row[1]["person"]):
+        first_line, problem = None, None
+        body_data = {}
+        for line, row in client_rows:
+            first_line = first_line or line
+            if row["place"] in body_data:
+                problem = problem or f"{person} has two {row['place']} rows, the second on line {line}."
+            body_data[row["place"]] = {"meas": number(row["meas"]), "height": number(row["height"]),
+                                       "circumferential": true_words.get(row["circumferential"].lower(),
+                                                                         row["circumferential"])}
+        yield first_line, person, body_data, problem
+
+
+def json_lines_clients(lines):
+    # yields (line, person, body_data, problem) for each client, one json object per line, blank lines are skipped
+    for line, text in enumerate(lines, 1):
+        if not text.strip():
+            continue
+        try:
+            client = json.loads(text)
+        except ValueError as error:
+            yield line, None, {}, f"not json, {error}"
+            continue
+        if not isinstance(client, dict) or not isinstance(client.get("body_data"), dict):
+            yield line, None, {}, "must be an object with person and body_data"
+            continue
+        yield line, client.get("person"), client["body_data"], None
+
+
+def read_measurements(file_name, garment_classes=("Tshirt", "Dress", "Pencil_Skirt"), invalid=None):
+    """
+    Reads the clients in a measurements file one at a time.
+    :param file_name: a .csv, .tsv or .jsonl file, see the module docstring
+    :param garment_classes: the garments that will be made, every client must have the places they need
+    :param invalid: function(line, message) called for each client that fails the checks, which is then left
+        out.  When None the first one raises ValueError.
+    :return: generator of MeasurementRecord(person, body_data, line)
+    """
+    places = required_places(garment_classes)
+    with open(file_name, newline="") as measurements_file:
+        if file_name.endswith((".csv", ".tsv")):
+            clients = csv_clients(csv.reader(measurements_file, delimiter="\t" if file_name.endswith(".tsv") else ","))
+        elif file_name.endswith((".jsonl", ".ndjson")):
+            clients = json_lines_clients(measurements_file)
+        else:
+            raise ValueError(f"Module measurement_files: {file_name} is not a .csv, .tsv or .jsonl file.")
+        for line, person, body_data, problem in clients:
+            try:
+                if problem:
+                    raise ValueError(problem)
+                check_body_data(person, body_data, places)
+            except ValueError as error:
+                if invalid is None:
+                    raise ValueError(f"{file_name} line {line}: {error}") from None
+                invalid(line, str(error))
+                continue
+            yield MeasurementRecord(person, body_data, line)
+
+
+def is_measurements_file(name):
+    # whether batch_garments should read name with read_measurements rather than import it
+    return name.endswith((".csv", ".tsv", ".jsonl", ".ndjson"))
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+repository_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repository_folder)
+
+
+@pytest.fixture(autouse=True)
+def in_repository_folder(monkeypatch):
+    # the style sheets and font are found relative to the repository folder, like the per-client scripts
+    monkeypatch.chdir(repository_folder)
+
+
+@pytest.fixture
+def body():
+    from measurements_Debra_Martin import body_data, person
+    return person, body_data
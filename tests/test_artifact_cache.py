@@ -0,0 +1,82 @@
+import os
+import shutil
+
+import custom_knit_garments
+
+
+def write_file(path, contents):
+    with open(path, "wb") as output_file:
+        output_file.write(contents)
+    return path
+
+
+def read_file(path):
+    with open(path, "rb") as input_file:
+        return input_file.read()
+
+
+def test_files_hit_and_miss(tmp_path):
+    cache = custom_knit_garments.ArtifactCache(str(tmp_path / "cache"))
+    key = cache.key("plots", None, [1, 2], {"waist": 10})
+    assert key == cache.key("plots", None, [1, 2], {"waist": 10})
+    assert key != cache.key("plots", None, [1, 2], {"waist": 11})
+    output = tmp_path / "plot.svg"
+    assert cache.get(key, [str(output)]) is None
+    assert not output.exists()
+    cache.put(key, [write_file(str(tmp_path / "made.svg"), b"<svg/>")], {"rows": 3})
+    assert cache.get(key, [str(output)]) == {"rows": 3}
+    assert read_file(output) == b"<svg/>"
+
+
+def test_data_hit_and_miss(tmp_path):
+    cache = custom_knit_garments.ArtifactCache(str(tmp_path))
+    key = cache.key("instructions", "Front")
+    assert cache.get_data(key) is None
+    cache.put_data(key, [b"first", b""])
+    assert cache.get_data(key) == ([b"first", b""], {})
+    cache.put_data(key, [b"again"])  # the entry already cached is kept
+    assert cache.get_data(key) == ([b"first", b""], {})
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = custom_knit_garments.ArtifactCache(str(tmp_path), max_bytes=2500)
+    keys = [cache.key("pdf", number) for number in range(3)]
+    for age, key in enumerate(keys):
+        cache.put_data(key, [bytes(1000)])
+        os.utime(cache.entry_path(key), (1000 + age, 1000 + age))
+    # all three add up to more than max_bytes, so the oldest went when the third was put
+    assert cache.get_data(keys[0]) is None
+    assert cache.get_data(keys[1]) is not None  # now the most recently used
+    os.utime(cache.entry_path(keys[1]), (5000, 5000))
+    cache.put_data(cache.key("pdf", 3), [bytes(1000)])
+    assert cache.get_data(keys[2]) is None
+    assert cache.get_data(keys[1]) is not None
+
+
+def test_evict_skips_entries_removed_by_another_process(tmp_path, monkeypatch):
+    cache = custom_knit_garments.ArtifactCache(str(tmp_path), max_bytes=10 ** 6)
+    gone, kept = cache.key("gone"), cache.key("kept")
+    cache.put_data(gone, [b"gone"])
+    cache.put_data(kept, [b"kept"])
+    scandir = os.scandir
+
+    def scandir_while_evicting(path):
+        # another process evicts gone after this one has listed it
+        if path == cache.entry_path(gone):
+            shutil.rmtree(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir_while_evicting)
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.get_data(kept) is None
+
+
+def test_evict_leaves_entries_being_written(tmp_path):
+    cache = custom_knit_garments.ArtifactCache(str(tmp_path), max_bytes=0)
+    key = cache.key("plots")
+    being_written = os.path.join(os.path.dirname(cache.entry_path(key)), "tmpwriting")
+    os.makedirs(being_written)
+    write_file(os.path.join(being_written, "0"), b"half written")
+    cache.evict()
+    assert os.path.exists(being_written)
@@ -0,0 +1,44 @@
+import os
+
+import batch_garments
+import custom_knit_garments
+
+
+class CrashingTshirt(custom_knit_garments.Tshirt):
+    # stands in for a worker killed outright, for example for using too much memory
+    def __init__(self, *args, **kwargs):
+        os._exit(1)
+
+
+def test_a_failing_job_only_fills_in_its_own_error(body):
+    jobs = [batch_garments.GarmentJob(body[0], body[1], garment_class, (10, 10))
+            for garment_class in ("Tshirt", "Sweater", "Dress")]
+    results = {job_result.job.garment_class: job_result
+               for job_result in batch_garments.run_batch(jobs, max_workers=2, make_outputs=False)}
+    assert "AttributeError" in results["Sweater"].error and results["Sweater"].result is None
+    for garment_class in ("Tshirt", "Dress"):
+        assert results[garment_class].error is None
+        assert results[garment_class].result["total_yarn_meters"] > 0
+
+
+def test_the_batch_carries_on_after_a_worker_is_killed(body):
+    jobs = [batch_garments.GarmentJob(body[0], body[1], garment_class, (10, 10))
+            for garment_class in ("Tshirt", CrashingTshirt, "Dress", "Tshirt")]
+    results = list(batch_garments.run_batch(jobs, max_workers=1, max_pending=1, make_outputs=False))
+    assert [job_result.job for job_result in results] == jobs
+    assert "BrokenProcessPool" in results[1].error and results[1].result is None
+    for job_result in results[:1] + results[2:]:
+        garment = getattr(custom_knit_garments, job_result.job.garment_class)(body[1], body[0], gauge=(10, 10))
+        assert job_result.error is None
+        assert job_result.result["title"] == garment.title
+        assert job_result.result["total_yarn_meters"] == garment.total_yarn_meters
+
+
+def test_jobs_waiting_in_a_killed_pool_are_reported(body):
+    jobs = [batch_garments.GarmentJob(body[0], body[1], garment_class, (10, 10))
+            for garment_class in (CrashingTshirt, "Tshirt", "Dress")]
+    results = list(batch_garments.run_batch(jobs, max_workers=1, max_pending=2, make_outputs=False))
+    # the Tshirt was handed to the pool with the crashing job and goes down with it
+    assert {job_result.job.garment_class for job_result in results[:2]} == {CrashingTshirt, "Tshirt"}
+    assert all(job_result.error is not None for job_result in results[:2])
+    assert results[2].job.garment_class == "Dress" and results[2].error is None
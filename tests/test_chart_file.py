@@ -0,0 +1,60 @@
+import io
+
+import numpy as np
+import pytest
+
+import custom_knit_garments
+
+
+@pytest.mark.parametrize("garment_name, gauge", [("Tshirt", (10, 10)), ("Dress", (28, 40))])
+def test_chart_file_round_trip(tmp_path, body, garment_name, gauge):
+    garment = getattr(custom_knit_garments, garment_name)(body[1], body[0], gauge=gauge)
+    garment.results_folder = str(tmp_path)
+    for pattern_piece_name in garment.required_pattern_pieces:
+        garment.save_chart_file(pattern_piece_name)
+        chart = garment.create_needle_chart(pattern_piece_name)
+        header, rows = custom_knit_garments.read_chart_file(garment.chart_file_name(pattern_piece_name))
+        assert header["magic"] == "KNITCHRT"
+        assert header["version"] == custom_knit_garments.chart_file_version
+        assert header["rows"] == len(rows) == len(chart)
+        assert header["gauge"] == gauge
+        assert (header["left_needles"], header["right_needles"], header["zero_needle"]) == (100, 100, False)
+        assert (header["style"], header["piece"]) == (garment.style_name, pattern_piece_name)
+        for row in chart:
+            record = rows[row]
+            spans = chart.run_for_row(row).spans.tolist()
+            assert record["spans"][:record["count"]].tolist() == spans
+            assert not record["spans"][record["count"]:].any()
+            assert record["stitches"] == len(chart[row]["all"])
+            status = chart.row_status.get(row, "knit")
+            assert custom_knit_garments.chart_file_statuses[record["status"]] == status
+
+
+def test_chart_file_rows_are_read_only_and_match_a_file_object(tmp_path, body):
+    garment = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    garment.results_folder = str(tmp_path)
+    garment.save_chart_file("Front")
+    file_name = garment.chart_file_name("Front")
+    _, rows = custom_knit_garments.read_chart_file(file_name)
+    assert isinstance(rows, np.memmap)
+    with pytest.raises(ValueError):
+        rows["stitches"][0] = 1
+    in_memory = io.BytesIO()
+    custom_knit_garments.write_chart_file(in_memory, garment.create_needle_chart("Front"), (10, 10),
+                                          garment.style_name, "Front")
+    with open(file_name, "rb") as chart_file:
+        assert chart_file.read() == in_memory.getvalue()
+
+
+def test_other_files_are_not_read_as_chart_files(tmp_path):
+    not_a_chart = tmp_path / "not a chart.bin"
+    not_a_chart.write_bytes(b"PK\x03\x04" + bytes(200))
+    with pytest.raises(ValueError, match="is not a chart file"):
+        custom_knit_garments.read_chart_file(str(not_a_chart))
+    header = np.zeros(1, dtype=custom_knit_garments.chart_file_header)
+    header["magic"] = custom_knit_garments.chart_file_magic
+    header["version"] = custom_knit_garments.chart_file_version + 1
+    newer = tmp_path / "newer.chart"
+    newer.write_bytes(header.tobytes())
+    with pytest.raises(ValueError, match="chart file, only version"):
+        custom_knit_garments.read_chart_file(str(newer))
@@ -0,0 +1,44 @@
+import numpy as np
+
+import custom_knit_garments
+
+
+def made(garment):
+    return set(garment.__dict__.get("artifacts", {}))
+
+
+def same_charts(garment, other):
+    for pattern_piece_name in garment.required_pattern_pieces:
+        chart, other_chart = garment.create_needle_chart(pattern_piece_name), other.create_needle_chart(pattern_piece_name)
+        assert len(chart) == len(other_chart)
+        assert chart.row_status == other_chart.row_status
+        for run, other_run in zip(chart.runs, other_chart.runs):
+            assert (run.start_row, run.end_row) == (other_run.start_row, other_run.end_row)
+            assert np.array_equal(run.spans, other_run.spans)
+
+
+def test_a_piece_gauge_only_remakes_what_is_made_from_it(body):
+    garment = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    garment.total_yarn_meters
+    back_chart = garment.create_needle_chart("Back")
+    front_shape = garment.make_pattern_shape("Front")
+    garment.set_gauge_for_piece("Front", 28, 40)
+    assert made(garment) == {("pattern_shape", "Front"), ("pattern_shape", "Back"), ("needle_chart", "Back"),
+                             ("yarn", "Back")}
+    assert garment.create_needle_chart("Back") is back_chart
+    assert garment.make_pattern_shape("Front") is front_shape
+    other = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    other.set_gauge_for_piece("Front", 28, 40)
+    same_charts(garment, other)
+    assert garment.total_yarn_meters == other.total_yarn_meters
+
+
+def test_hem_length_remakes_every_piece(body):
+    garment = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    garment.total_yarn_meters
+    garment.set_hem_length(6)
+    assert made(garment) == set()
+    other = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    other.set_hem_length(6)
+    same_charts(garment, other)
+    assert garment.total_yarn_meters == other.total_yarn_meters
@@ -0,0 +1,66 @@
+import pytest
+
+import garment_pdf
+
+square = '<rect x="0" y="0" width="10" height="10" fill="red"/>'
+gradient = ('<defs><linearGradient id="fade"><stop offset="0" stop-color="white"/><stop offset="1" stop-color="blue"/>'
+            '</linearGradient></defs><rect x="0" y="0" width="10" height="10" fill="url(#fade)"/>')
+
+
+def svg_file(tmp_path, name, attributes, body=square):
+    path = tmp_path / name
+    path.write_text(f'<svg xmlns="http://www.w3.org/2000/svg" {attributes}>{body}</svg>')
+    return str(path)
+
+
+def new_pdf(resources):
+    pdf = garment_pdf.PDF(orientation='P', format='letter', unit='mm', resources=resources)
+    pdf.set_title("Tshirt for Debra Martin")
+    pdf.add_page()
+    return pdf
+
+
+@pytest.mark.parametrize("attributes", ['viewBox="0 0 20 10"', 'width="20" height="10"',
+                                        'width="20" height="10" viewBox="0 0 20 10"'])
+def test_kept_svgs_are_placed_like_pdf_image(tmp_path, attributes):
+    resources = garment_pdf.PDFResources()
+    file_name = svg_file(tmp_path, "plot.svg", attributes)
+    kept = new_pdf(resources)
+    kept.place_image(file_name, x=10, y=20, w=100)
+    placed = new_pdf(resources)
+    placed.image(name=file_name, x=10, y=20, w=100)
+    assert kept.pages[1].contents == placed.pages[1].contents
+    new_pdf(resources).place_image(file_name, x=10, y=20, w=100)
+    assert len(resources.svgs) == 1
+
+
+def test_kept_svgs_with_gradients(tmp_path):
+    resources = garment_pdf.PDFResources()
+    file_name = svg_file(tmp_path, "gradient.svg", 'viewBox="0 0 10 10"', gradient)
+    for _ in range(2):
+        pdf = new_pdf(resources)
+        pdf.place_image(file_name, x=10, y=20, w=50)
+        assert bytes(pdf.output()).startswith(b"%PDF")
+
+
+def test_svg_with_no_size_gives_fpdfs_error(tmp_path):
+    file_name = svg_file(tmp_path, "no_size.svg", "")
+    with pytest.raises(ValueError, match="viewBox"):
+        new_pdf(garment_pdf.PDFResources()).place_image(file_name, x=10, y=20, w=100)
+
+
+def test_svgs_placed_once_are_not_kept(tmp_path):
+    resources = garment_pdf.PDFResources()
+    file_name = svg_file(tmp_path, "stitch_map.svg", 'viewBox="0 0 20 10"')
+    new_pdf(resources).place_image(file_name, x=10, y=20, w=100, keep=False)
+    assert len(resources.svgs) == 0
+
+
+def test_least_recently_used_svgs_are_dropped(tmp_path):
+    file_names = [svg_file(tmp_path, f"plot {number}.svg", f'viewBox="0 0 {number + 1} 10"') for number in range(3)]
+    size = len(open(file_names[0], "rb").read())
+    resources = garment_pdf.PDFResources(max_svg_bytes=2 * size + 1)
+    pdf = new_pdf(resources)
+    for file_name in file_names:
+        pdf.place_image(file_name, x=10, y=20, w=100)
+    assert len(resources.svgs) == 2
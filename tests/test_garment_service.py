@@ -0,0 +1,124 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import garment_service
+
+
+@pytest.fixture
+def server_for():
+    # starts serve() for a PatternService on a free localhost port, stops them after the test
+    started = []
+
+    def start(service):
+        server = garment_service.serve(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        started.append((server, service))
+        return server
+
+    yield start
+    for server, service in started:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=60)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        if response.getheader("Content-Type") == "application/json":
+            data = json.loads(data)
+        return response.status, dict(response.getheaders()), data
+    finally:
+        connection.close()
+
+
+def job_request(body, garment="Tshirt", gauge=(10, 10)):
+    return json.dumps({"person": body[0], "body_data": body[1], "garment": garment, "gauge": list(gauge)})
+
+
+def test_job_runs_to_a_pdf(server_for, body):
+    server = server_for(garment_service.PatternService(workers=1))
+    status, headers, job = request(server, "POST", "/jobs", job_request(body))
+    assert status == 202
+    assert headers["Location"] == f"/jobs/{job['id']}"
+    deadline = time.monotonic() + 300
+    while job["status"] in ("queued", "running") and time.monotonic() < deadline:
+        time.sleep(0.2)
+        status, _, job = request(server, "GET", f"/jobs/{job['id']}")
+        assert status == 200
+    assert job["status"] == "done", job["error"]
+    assert job["stage"] is None
+    assert job["result"]["total_yarn_meters"] > 0
+    assert set(job["result"]["needle_charts"]) == {"Front", "Back"}
+    status, headers, pdf = request(server, "GET", f"/jobs/{job['id']}/pdf")
+    assert status == 200
+    assert headers["Content-Type"] == "application/pdf"
+    assert "filename*=UTF-8''" in headers["Content-Disposition"]
+    assert pdf.startswith(b"%PDF")
+    status, _, counts = request(server, "GET", "/health")
+    assert status == 200 and counts["done"] == 1
+
+
+def test_full_queue_turns_jobs_away(server_for, body):
+    # with no workers the first job stays queued and fills the queue
+    server = server_for(garment_service.PatternService(workers=0, max_queued=1))
+    status, _, job = request(server, "POST", "/jobs", job_request(body))
+    assert status == 202 and job["status"] == "queued"
+    status, headers, error = request(server, "POST", "/jobs", job_request(body))
+    assert status == 503
+    assert headers["Retry-After"] == "5"
+    assert "full" in error["error"]
+    status, _, error = request(server, "GET", f"/jobs/{job['id']}/pdf")
+    assert status == 409
+    status, _, counts = request(server, "GET", "/health")
+    assert counts["queued"] == 1
+
+
+@pytest.mark.parametrize("job, message", [
+    ("not json", "Expecting value"),
+    ("[]", "json object"),
+    ('{"person": "Nobody"}', "needs body_data, garment, gauge"),
+    ('{"person": "Nobody", "body_data": {}, "garment": "Hat", "gauge": [10, 10]}', "garment must be"),
+    ('{"person": "Nobody", "body_data": {}, "garment": "Tshirt", "gauge": [10]}', "gauge must be"),
+    ('{"person": "Nobody", "body_data": {}, "garment": "Tshirt", "gauge": [10, 10]}', "Nobody has no"),
+])
+def test_bad_jobs_are_refused_before_they_are_queued(server_for, job, message):
+    service = garment_service.PatternService(workers=0, max_queued=1)
+    server = server_for(service)
+    status, _, error = request(server, "POST", "/jobs", job)
+    assert status == 400
+    assert message in error["error"]
+    assert service.queue.qsize() == 0
+
+
+def test_oversized_jobs_and_unknown_paths(server_for):
+    server = server_for(garment_service.PatternService(workers=0))
+    status, _, _ = request(server, "POST", "/jobs", b"{}",
+                           {"Content-Length": str(garment_service.max_request_bytes + 1)})
+    assert status == 413
+    for method, path in [("POST", "/orders"), ("GET", "/jobs/99"), ("GET", "/jobs/99/pdf"), ("GET", "/nothing")]:
+        status, _, _ = request(server, method, path, b"{}" if method == "POST" else None)
+        assert status == 404, path
+
+
+def test_job_stage_goes_back_to_the_outer_stage():
+    job = garment_service.Job("1", {})
+    progress = garment_service.JobProgress(job)
+    with progress.stage("pdf"):
+        with progress.stage("plots"):
+            assert job.stage == "plots"
+        assert job.stage == "pdf"
+        with pytest.raises(RuntimeError):
+            with progress.stage("instructions", "Front"):
+                raise RuntimeError("failed")
+        assert job.stage == "pdf"
+    assert job.stage is None
+    assert job.stages_done == ["plots", "pdf"]
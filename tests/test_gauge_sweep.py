@@ -0,0 +1,43 @@
+import custom_knit_garments
+
+
+def test_sweep_matches_the_needle_charts(body):
+    garment = custom_knit_garments.Dress(body[1], body[0], gauge=(10, 10))
+    gauges = [(10, 10), (20, 28), (28, 40)]
+    sweep = garment.gauge_sweep(gauges)
+    for gauge in gauges:
+        at_gauge = custom_knit_garments.Dress(body[1], body[0], gauge=gauge)
+        assert sweep[gauge]["error"] is None
+        assert sweep[gauge]["yarn_meters"] == at_gauge.total_yarn_meters
+        for pattern_piece_name in at_gauge.required_pattern_pieces:
+            assert sweep[gauge]["rows"][pattern_piece_name] == len(at_gauge.create_needle_chart(pattern_piece_name))
+
+
+def test_repeated_gauges_are_counted_once(body):
+    garment = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    assert garment.gauge_sweep([(10, 10), [10, 10]]) == garment.gauge_sweep([(10, 10)])
+
+
+def test_gauges_that_do_not_fit_the_bed_are_reported(body):
+    garment = custom_knit_garments.Dress(body[1], body[0], gauge=(10, 10))
+    sweep = garment.gauge_sweep([(10, 10), (60, 60), (28, 40)])
+    assert list(sweep) == [(10, 10), (60, 60), (28, 40)]
+    assert sweep[(60, 60)]["yarn_meters"] is None
+    assert "does not fit" in sweep[(60, 60)]["error"]
+    assert sweep[(10, 10)] == garment.gauge_sweep([(10, 10)])[(10, 10)]
+    assert sweep[(28, 40)]["yarn_meters"] > sweep[(10, 10)]["yarn_meters"] > 0
+
+
+def test_estimate_matches_the_needle_charts(body):
+    for gauge in [(10, 10), (28, 40)]:
+        garment = custom_knit_garments.Dress(body[1], body[0], gauge=gauge)
+        assert garment.estimate_yarn_meters() == garment.total_yarn_meters
+        assert abs(garment.estimate_yarn_meters(approximate=True) - garment.total_yarn_meters) < \
+            garment.total_yarn_meters / 10
+
+
+def test_estimate_at_a_gauge_that_does_not_fit_the_bed(body):
+    garment = custom_knit_garments.Dress(body[1], body[0], gauge=(10, 10))
+    assert garment.estimate_yarn_meters(gauge=(60, 60)) is None
+    assert garment.estimate_yarn_meters(gauge=(60, 60), approximate=True) is None
+    assert garment.estimate_yarn_meters(gauge=(28, 40)) > 0
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import measurement_files
+
+
+def csv_rows(person, body_data):
+    return [f"{person},{place},{values['meas']},{values['height']},{str(values['circumferential']).lower()}"
+            for place, values in body_data.items()]
+
+
+def write_csv(tmp_path, rows, name="clients.csv"):
+    path = tmp_path / name
+    path.write_text("\n".join(["person,place,meas,height,circumferential"] + rows) + "\n")
+    return str(path)
+
+
+def write_json_lines(tmp_path, lines):
+    path = tmp_path / "clients.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_csv_and_json_lines_clients_are_read(tmp_path, body):
+    person, body_data = body
+    file_name = write_csv(tmp_path, csv_rows(person, body_data) + csv_rows("Ann Lee", body_data))
+    records = list(measurement_files.read_measurements(file_name))
+    assert [(record.person, record.line) for record in records] == [(person, 2), ("Ann Lee", 2 + len(body_data))]
+    assert records[0].body_data == {place: {key: float(value) if key != "circumferential" else value
+                                            for key, value in values.items()} for place, values in body_data.items()}
+    file_name = write_json_lines(tmp_path, [json.dumps({"person": person, "body_data": body_data}), "",
+                                            json.dumps({"person": "Ann Lee", "body_data": body_data})])
+    records = list(measurement_files.read_measurements(file_name))
+    assert [(record.person, record.body_data, record.line) for record in records] == \
+        [(person, body_data, 1), ("Ann Lee", body_data, 3)]
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda rows: rows + rows[-1:], "has two"),
+    (lambda rows: [rows[0].replace(",80,", ",eighty,", 1)] + rows[1:], "must be a number of cm"),
+    (lambda rows: [rows[0].replace(",80,", ",0,", 1)] + rows[1:], "must be more than 0 cm"),
+    (lambda rows: [rows[0].replace("true", "round")] + rows[1:], "must be true or false"),
+    (lambda rows: [row for row in rows if ",waist," not in row], "has no waist measurements"),
+])
+def test_malformed_csv_clients(tmp_path, body, change, message):
+    rows = csv_rows(*body)
+    assert rows[0].startswith(f"{body[0]},floor,80,")
+    file_name = write_csv(tmp_path, csv_rows("Ann Lee", body[1]) + change(rows))
+    with pytest.raises(ValueError, match=f"line {2 + len(rows)}: .*{message}"):
+        list(measurement_files.read_measurements(file_name))
+    invalid = []
+    records = measurement_files.read_measurements(file_name, invalid=lambda line, error: invalid.append(line))
+    assert [record.person for record in records] == ["Ann Lee"]
+    assert invalid == [2 + len(rows)]
+
+
+@pytest.mark.parametrize("line, message", [
+    ('{"person": "Ann Lee", "body_data": {', "not json"),
+    ('["Ann Lee"]', "must be an object with person and body_data"),
+    ('{"person": "Ann Lee"}', "must be an object with person and body_data"),
+    ('{"person": "Ann Lee", "body_data": {}}', "Ann Lee has no"),
+    ('{"person": "", "body_data": {}}', "has no person name"),
+])
+def test_malformed_json_lines_clients(tmp_path, body, line, message):
+    file_name = write_json_lines(tmp_path, [json.dumps({"person": body[0], "body_data": body[1]}), line])
+    with pytest.raises(ValueError, match=f"line 2: .*{message}"):
+        list(measurement_files.read_measurements(file_name))
+    invalid = []
+    records = measurement_files.read_measurements(file_name, invalid=lambda line, error: invalid.append(error))
+    assert [record.person for record in records] == [body[0]]
+    assert len(invalid) == 1 and message in invalid[0]
+
+
+def test_other_files_are_rejected(tmp_path, body):
+    path = tmp_path / "clients.csv"
+    path.write_text("name,place,meas,height,circumferential\n")
+    with pytest.raises(ValueError, match="columns must be"):
+        list(measurement_files.read_measurements(str(path)))
+    path = tmp_path / "measurements_Ann_Lee.py"
+    path.write_text("person = 'Ann Lee'\n")
+    with pytest.raises(ValueError, match="is not a .csv, .tsv or .jsonl file"):
+        list(measurement_files.read_measurements(str(path)))
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import custom_knit_garments
+from garment_benchmarks import synthetic_body_data
+
+gauges = [(10, 10), (20, 20), (20, 28), (28, 40), (32, 38)]
+garments = ["Tshirt", "Dress", "Pencil_Skirt"]
+
+
+def reference_intercepts(outline, y):
+    # the per row loop the batched row_intercepts replaced: every segment that contains y, one at a time
+    x_cm = []
+    for (x1, y1), (x2, y2) in zip(outline, outline[1:] + outline[:1]):
+        if min(y1, y2) <= y <= max(y1, y2):
+            if y1 > y2:
+                x_cm.append(np.interp(y, (y2, y1), (x2, x1)))
+            else:
+                x_cm.append(np.interp(y, (y1, y2), (x1, x2)))
+    return x_cm
+
+
+def reference_chart(garment, pattern_piece_name):
+    # {row: (intercepts, needles in work, needle states)} worked out one row at a time
+    shape = garment.pattern_shapes[pattern_piece_name]["pattern_shape"]
+    gauge = garment.required_pattern_pieces[pattern_piece_name]["gauge"]
+    stitch_width_cm, row_height_cm = 10 / gauge[0], 10 / gauge[1]
+    outline = shape.coords.tolist()
+    y_vals = np.array(shape.y_vals)
+    total_rows = int((max(y_vals) - min(y_vals)) / row_height_cm)
+    chart = {}
+    for row in range(total_rows + 1):
+        y = row * row_height_cm + min(y_vals)
+        ints = np.unique([int(x / stitch_width_cm) for x in reference_intercepts(outline, y)])
+        needle_states = {}
+        for needle in range(-100, 101):
+            if needle != 0:
+                status = "A"
+                if ints[0] <= needle <= ints[1]:
+                    status = "B"
+                if len(ints) > 3 and ints[2] <= needle <= ints[3]:
+                    status = "E"
+                needle_states[needle] = status
+        chart[row] = (ints, [needle for needle, status in needle_states.items() if status in "BE"], needle_states)
+    return chart
+
+
+@pytest.mark.parametrize("garment_name", garments)
+@pytest.mark.parametrize("gauge", gauges)
+def test_needle_chart_matches_the_per_row_loop(body, garment_name, gauge):
+    garment = getattr(custom_knit_garments, garment_name)(body[1], body[0], gauge=gauge)
+    for pattern_piece_name in garment.required_pattern_pieces:
+        chart = garment.create_needle_chart(pattern_piece_name)
+        reference = reference_chart(garment, pattern_piece_name)
+        assert list(chart) == list(reference)
+        for row, (intercepts, in_work, needle_states) in reference.items():
+            assert chart[row]["intercepts"].tolist() == intercepts.tolist(), (pattern_piece_name, row)
+            assert chart[row]["all"] == in_work, (pattern_piece_name, row)
+            assert chart[row]["needle_states"] == needle_states, (pattern_piece_name, row)
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_needle_chart_matches_the_per_row_loop_for_other_bodies(seed):
+    body_data = synthetic_body_data(girth=0.9 + seed / 20, stature=1, seed=seed)
+    garment = custom_knit_garments.Dress(body_data, f"Synthetic {seed}", gauge=(28, 40))
+    for pattern_piece_name in garment.required_pattern_pieces:
+        chart = garment.create_needle_chart(pattern_piece_name)
+        for row, (intercepts, _, _) in reference_chart(garment, pattern_piece_name).items():
+            assert chart.run_for_row(row).spans.tolist() == intercepts.tolist(), (pattern_piece_name, row)
+
+
+def test_rows_through_vertices_and_flat_edges():
+    # rows land exactly on every vertex, on a flat edge at the bottom and the top and on a flat ledge
+    outline = [(-10, 0), (-10, 4), (-6, 4), (-3, 8), (3, 8), (6, 4), (10, 4), (10, 0)]
+    shape = custom_knit_garments.PatternPiece(outline)
+    row_heights_cm = np.arange(0, 8.5, 0.5)
+    intercepts, counts = custom_knit_garments.row_intercepts(shape.edges, row_heights_cm, 1.0)
+    for row, y in enumerate(row_heights_cm):
+        expected = np.unique([int(x) for x in reference_intercepts(outline, y)])
+        assert intercepts[row, :counts[row]].tolist() == expected.tolist(), y
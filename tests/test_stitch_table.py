@@ -0,0 +1,47 @@
+import custom_knit_garments
+
+
+def table_rows(garment, pattern_piece_name):
+    # (first row, last row, status, stitches, [(low, high), ...]) for each table row
+    rows = []
+    for row_text, status, needles in garment.create_data_for_stitch_table(pattern_piece_name)[1:]:
+        first, _, last = row_text.split()[1].partition("-")
+        stitches, sections = needles.split(" needles, ")
+        rows.append((int(first), int(last or first), status, int(stitches),
+                     [tuple(int(needle) for needle in section.split(" to ")) for section in sections.split(", ")]))
+    return rows
+
+
+def test_stitch_table_covers_every_row_once(body):
+    garment = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    chart = garment.create_needle_chart("Front")
+    next_row = 0
+    for first, last, _, _, sections in table_rows(garment, "Front"):
+        assert first == next_row
+        next_row = last + 1
+        for row in (first, last):
+            spans = chart.run_for_row(row).spans.tolist()
+            assert sections == list(zip(spans[0::2], spans[1::2]))
+    assert next_row == len(chart)
+
+
+def test_status_rows_have_their_own_table_row(body):
+    garment = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    row_status = garment.instruction_row_status("Front")
+    rows = table_rows(garment, "Front")
+    statuses = {first: status for first, last, status, _, _ in rows if first == last}
+    for row, status in row_status.items():
+        assert statuses[row] == status
+    assert all(status == "knit" for first, last, status, _, _ in rows if first != last)
+    assert "See Hem Instructions" in statuses.values()
+    assert "See Instructions for Split/Hold" in statuses.values()
+
+
+def test_needle_count_matches_the_sections(body):
+    garment = custom_knit_garments.Tshirt(body[1], body[0], gauge=(10, 10))
+    bed = garment.needle_bed
+    rows = table_rows(garment, "Front")
+    for _, _, _, stitches, sections in rows:
+        assert stitches == sum(int(bed.needles_between(low, high)) for low, high in sections)
+    split = [sections for _, _, status, _, sections in rows if status == "See Instructions for Split/Hold"]
+    assert split and all(len(sections) > 1 for sections in split)